@@ -1 +1,38 @@
-from . import config, main, models, views, utils
\ No newline at end of file
+import importlib
+
+# submodules are imported on first attribute access, so that `import ccc`
+# stays cheap and does not pull in pandas
+__all__ = [
+    "app",
+    "archive",
+    "batch",
+    "bench",
+    "cache",
+    "categorizer",
+    "clustering",
+    "config",
+    "discovery",
+    "export",
+    "instrument",
+    "main",
+    "models",
+    "money",
+    "pdfreader",
+    "query",
+    "rebate",
+    "render",
+    "registry",
+    "reports",
+    "schema",
+    "store",
+    "views",
+    "utils",
+    "watcher",
+    "xlreader",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,31 @@
+import logging
+from dataclasses import dataclass
+
+from .config import ConfigSnapshot, get_config
+from .utils import LoggerManager
+
+APP_NAME = "ccc"
+
+
+@dataclass
+class AppContext:
+    """Process state set up explicitly by the entry point
+
+    Importing ccc has no side effects; the log handlers and the config file
+    are only created here.
+    """
+
+    config: ConfigSnapshot
+    logger: logging.Logger
+
+
+def create_app(debug: bool = False) -> AppContext:
+    config = get_config()
+    logger = LoggerManager(
+        APP_NAME,
+        debug_mode=debug,
+        async_mode=config.get("async_logging", False),
+        queue_size=config.get("log_queue_size", 10_000),
+        overflow=config.get("log_overflow", "drop"),
+    ).getLogger()
+    return AppContext(config=config, logger=logger)
@@ -0,0 +1,129 @@
+import errno
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from .cache import hash_file
+from .utils import get_time
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+
+class StatementArchive:
+    """Content-addressed archive of statement files in output_dir
+
+    Each distinct statement is stored once under `.objects/<hash>` and shows
+    up in output_dir under its download name as a hardlink to that object.
+    Files are moved in with an atomic rename when source and archive share a
+    filesystem, so nothing is copied. A re-downloaded export is recognised by
+    its hash and only the download is removed. The manifest maps content
+    hashes to names, so lookups never scan the directory.
+    """
+
+    manifest_name: str = ".archive.json"
+    objects_name: str = ".objects"
+
+    def __init__(self, dirpath: Path) -> None:
+        self.dirpath = Path(dirpath).expanduser()
+        self.objects_path = self.dirpath / self.objects_name
+        self.manifest_path = self.dirpath / self.manifest_name
+        self.manifest = self.load_manifest()
+
+    @classmethod
+    def from_config(cls, cfg) -> "StatementArchive":
+        return cls(Path(cfg["output_dir"]))
+
+    def load_manifest(self) -> dict:
+        if not self.manifest_path.is_file():
+            return {"objects": {}}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def save_manifest(self) -> None:
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get_object_path(self, content_hash: str, suffix: str) -> Path:
+        return self.objects_path / content_hash[:2] / f"{content_hash}{suffix}"
+
+    def has(self, content_hash: str) -> bool:
+        return content_hash in self.manifest["objects"]
+
+    def get(self, content_hash: str) -> Optional[Path]:
+        """Archived path of a statement, by content hash"""
+        entry = self.manifest["objects"].get(content_hash)
+        if entry is None:
+            return None
+        return self.dirpath / entry["names"][-1]
+
+    @staticmethod
+    def move(src: Path, dst: Path) -> None:
+        try:
+            os.rename(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # across filesystems; copy next to dst so the final step is atomic
+            tmp_path = dst.with_suffix(".tmp")
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, dst)
+            os.remove(src)
+
+    @staticmethod
+    def link(src: Path, dst: Path) -> None:
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            lg.debug(f"hardlink unavailable, copying {dst.name}; {e}")
+            shutil.copy2(src, dst)
+
+    def get_link_name(self, fpath: Path, obj_path: Path, content_hash: str) -> str:
+        """Download name, unless it is taken by a different statement"""
+        dst = self.dirpath / fpath.name
+        if not dst.exists() or os.path.samefile(dst, obj_path):
+            return fpath.name
+        return f"{fpath.stem}-{content_hash[:8]}{fpath.suffix}"
+
+    def add(self, fpath: Path, content_hash: str = "") -> Path:
+        """Archives fpath and returns its path in the archive
+
+        The source is consumed: it is renamed into the archive, or removed
+        when the archive already holds the same content.
+        """
+        fpath = Path(fpath)
+        content_hash = content_hash or hash_file(fpath)
+        obj_path = self.get_object_path(content_hash, fpath.suffix)
+        obj_path.parent.mkdir(parents=True, exist_ok=True)
+        in_archive = fpath.parent.resolve() == self.dirpath.resolve()
+
+        if obj_path.exists():
+            lg.info(f"{fpath.name} is already archived")
+            if not in_archive:
+                os.remove(fpath)
+        elif in_archive:
+            # an archived name from before the archive kept objects
+            self.link(fpath, obj_path)
+        else:
+            self.move(fpath, obj_path)
+
+        entry = self.manifest["objects"].setdefault(
+            content_hash,
+            {"size": obj_path.stat().st_size, "names": [], "archived": get_time()},
+        )
+        name = fpath.name if in_archive else None
+        if name is None:
+            name = self.get_link_name(fpath, obj_path, content_hash)
+        dst = self.dirpath / name
+        if not dst.exists():
+            self.link(obj_path, dst)
+        if name not in entry["names"]:
+            entry["names"].append(name)
+        self.save_manifest()
+        lg.debug(f"archived {fpath.name} as {name}")
+        return dst
@@ -0,0 +1,194 @@
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .cache import hash_bytes
+from .config import get_config
+from .models import FileManager, UobExcelReader
+from .schema import compact_from_config
+from .store import TransactionStore, make_row_keys
+from .utils import LoggerManager
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+
+@dataclass
+class FileTiming:
+    filepath: Path
+    rows: int = 0
+    read_time: float = 0.0
+    parse_time: float = 0.0
+
+    @property
+    def total_time(self) -> float:
+        return self.read_time + self.parse_time
+
+
+def read_file(fpath: Path) -> tuple[bytes, float]:
+    t0 = time.perf_counter()
+    with open(fpath, "rb") as f:
+        payload = f.read()
+    return payload, time.perf_counter() - t0
+
+
+def parse_file(
+    fpath: Path, payload: bytes, content_hash: str, dt_format: str
+) -> tuple[pd.DataFrame, float]:
+    t0 = time.perf_counter()
+    reader = UobExcelReader(dt_format=dt_format)
+    df = reader.parse_data_cached(fpath, payload=payload, content_hash=content_hash)
+    return df, time.perf_counter() - t0
+
+
+class FrameMerger:
+    """Merges statements as they arrive, dropping transactions repeated in
+    overlapping exports
+
+    Only one copy of each transaction is kept, so each parsed frame can be
+    released once it is added. Statements are added with their position in
+    the batch and the copy from the earliest statement wins, whichever
+    finishes parsing first. Identical transactions within one export are
+    genuine repeats; make_row_keys numbers them, so they stay distinct.
+    """
+
+    def __init__(self) -> None:
+        # row key -> position of the statement whose copy is kept
+        self.owners: dict[int, int] = {}
+        self.parts: dict[int, tuple[np.ndarray, pd.DataFrame]] = {}
+
+    def add(self, position: int, df: pd.DataFrame) -> None:
+        keys = make_row_keys(df).to_numpy()
+        is_new = np.ones(len(keys), dtype=bool)
+        displaced = defaultdict(list)
+        for i, key in enumerate(keys.tolist()):
+            owner = self.owners.get(key)
+            if owner is not None and owner < position:
+                is_new[i] = False
+                continue
+            if owner is not None:
+                displaced[owner].append(key)
+            self.owners[key] = position
+        for owner, dropped in displaced.items():
+            owner_keys, owner_df = self.parts[owner]
+            keep = ~np.isin(owner_keys, np.array(dropped, dtype=owner_keys.dtype))
+            self.parts[owner] = owner_keys[keep], owner_df[keep]
+        self.parts[position] = keys[is_new], df[is_new]
+
+    def merge(self) -> pd.DataFrame:
+        if not self.parts:
+            return pd.DataFrame()
+        df = pd.concat(
+            [self.parts.pop(i)[1] for i in sorted(self.parts)], ignore_index=True
+        )
+        return df.sort_values("date_transacted", kind="stable").reset_index(drop=True)
+
+
+class UobExcelBatchReader:
+    """Reads every UOB credit card statement export into a single frame"""
+
+    def __init__(
+        self,
+        fpaths: Optional[list[Path]] = None,
+        dt_format: str = "%d %b %Y",
+        filepattern: str = "CC_TXN_History_*.xls",
+        max_workers: Optional[int] = None,
+        io_workers: int = 4,
+    ):
+        self.dt_format = dt_format
+        self.filepattern = filepattern
+        self.fpaths = fpaths
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.io_workers = io_workers
+        self.timings: list[FileTiming] = []
+        self.df = pd.DataFrame()
+
+    def parse(self) -> pd.DataFrame:
+        fpaths = self.fpaths
+        if fpaths is None:
+            fpaths = FileManager(filepattern=self.filepattern).get_files()
+        lg.info(f"batch parsing {len(fpaths)} files; workers={self.max_workers}")
+
+        t0 = time.perf_counter()
+        timings = {fpath: FileTiming(fpath) for fpath in fpaths}
+        hashes = {}
+        # first file of each content hash; copies of it are not parsed again
+        parsed_hashes: dict[str, Path] = {}
+        positions = {fpath: i for i, fpath in enumerate(fpaths)}
+        merger = FrameMerger()
+        store = None
+        cfg = get_config()
+        if cfg.get("transaction_store", True):
+            store = TransactionStore.from_config(cfg)
+        initializer, initargs = LoggerManager.get_worker_logging()
+        # bounds the raw file contents held in memory at any one time
+        window = self.max_workers * 2
+        queue = deque(fpaths)
+        with (
+            ThreadPoolExecutor(max_workers=self.io_workers) as io_pool,
+            ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=initializer,
+                initargs=initargs,
+            ) as cpu_pool,
+        ):
+            reads = {}
+            parses = {}
+            while queue or reads or parses:
+                while queue and len(reads) + len(parses) < window:
+                    fpath = queue.popleft()
+                    reads[io_pool.submit(read_file, fpath)] = fpath
+                done, _ = wait(list(reads) + list(parses), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in reads:
+                        fpath = reads.pop(future)
+                        payload, timings[fpath].read_time = future.result()
+                        hashes[fpath] = hash_bytes(payload)
+                        first = parsed_hashes.setdefault(hashes[fpath], fpath)
+                        if first != fpath:
+                            lg.info(f"[{fpath.name}] same content as {first.name}")
+                            del payload
+                            continue
+                        fut = cpu_pool.submit(
+                            parse_file, fpath, payload, hashes[fpath], self.dt_format
+                        )
+                        parses[fut] = fpath
+                        del payload
+                    else:
+                        fpath = parses.pop(future)
+                        df, timings[fpath].parse_time = future.result()
+                        timings[fpath].rows = len(df)
+                        self.log_timing(timings[fpath])
+                        if store is not None:
+                            store.append(df, hashes[fpath], source_name=fpath.name)
+                        merger.add(positions[fpath], df)
+                        del df
+
+        self.timings = [timings[fpath] for fpath in fpaths]
+        self.df = merger.merge()
+        self.df = compact_from_config(self.df, cfg)
+        lg.info(
+            f"[batch] files={len(fpaths)} rows={len(self.df)} "
+            f"elapsed_time = {(time.perf_counter() - t0):.4f}s"
+        )
+        return self.df
+
+    @staticmethod
+    def log_timing(timing: FileTiming) -> None:
+        lg.info(
+            f"[{timing.filepath.name}] rows={timing.rows} "
+            f"read={timing.read_time:.4f}s parse={timing.parse_time:.4f}s"
+        )
@@ -0,0 +1,338 @@
+"""Benchmarks for the statement parser and the report views
+
+Run with `python -m ccc.bench --rows 1000 10000 100000 --out bench.json`.
+Synthetic statements mimic the UOB export layout and are kept in --workdir,
+so repeated runs only pay for generating each size once. Results, including
+throughput and peak memory per stage, are written as JSON to --out.
+"""
+
+import argparse
+import datetime as dt
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from .app import create_app
+from .cache import CategoryMemo
+from .categorizer import CategoryMatcher
+from .config import get_config
+from .models import UobExcelReader
+from .utils import get_latest_git_tag, get_time
+from .views import UobExcelViewer
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# wall time budget for a lightweight command, interpreter start included
+STARTUP_BUDGET_MS = 300
+STARTUP_SCRIPT = """
+import sys
+from ccc.main import main
+main(["config", "path"])
+heavy = [m for m in ("pandas", "numpy", "tomlkit") if m in sys.modules]
+sys.exit(f"imported {heavy}" if heavy else 0)
+"""
+
+PREAMBLE_ROWS = [
+    ["United Overseas Bank Limited"],
+    ["Account Type:", "UOB ONE CARD"],
+    ["Account Number:", "0000-0000-0000-0000"],
+    [],
+    ["Statement Date:", "07 Aug 2023"],
+    [],
+    ["Transaction History"],
+    [],
+    [],
+]
+LOCATIONS = ["SINGAPORE SG", "SINGAPORE", "LONDON GB", "SEATTLE US", "TOKYO JP"]
+FOREIGN_CURRENCIES = {"GB": "GBP", "US": "USD", "JP": "JPY"}
+SYNTHETIC_MERCHANTS = [
+    "NTUC FAIRPRICE",
+    "SHOPEE SINGAPORE MP",
+    "LAZADA SG",
+    "COLD STORAGE",
+    "STARBUCKS",
+    "AMAZON MKTPLACE",
+    "NETFLIX.COM",
+    "SPOTIFY",
+    "KOPITIAM",
+    "GUARDIAN HEALTH",
+]
+
+
+class Clock:
+    """Times a callable, optionally tracing its peak memory
+
+    tracemalloc slows python code down considerably, so timings and peak
+    memory are measured in separate runs.
+    """
+
+    def __init__(self, rows: int, trace_memory: bool = False) -> None:
+        self.rows = rows
+        self.trace_memory = trace_memory
+        self.results: list[dict] = []
+
+    def __call__(self, stage: str, func: Callable, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        peak = None
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.results.append(
+            {
+                "rows": self.rows,
+                "stage": stage,
+                "seconds": elapsed,
+                "rows_per_second": self.rows / elapsed if elapsed else None,
+                "peak_bytes": peak,
+            }
+        )
+        if not self.trace_memory:
+            lg.info(f"[bench] rows={self.rows} {stage} = {elapsed:.4f}s")
+        return result
+
+
+# rows per sheet in a BIFF8 workbook
+XLS_MAX_ROWS = 65_536
+FORMATS = ["xls", "xlsx"]
+
+
+def iter_statement_rows(rows: int, seed: int = 0, start: dt.date = dt.date(2023, 1, 1)):
+    """Rows of a synthetic statement in the UOB export layout"""
+    cfg = get_config()
+    rng = random.Random(seed)
+    merchants = list(cfg["category_mapper"].keys()) + SYNTHETIC_MERCHANTS
+    # a long tail of one-off merchants alongside the regulars
+    merchants += [f"MERCHANT {i:05d}" for i in range(max(10, rows // 50))]
+
+    yield from PREAMBLE_ROWS
+    yield list(cfg["parser_settings"]["columns_mapper"].keys())
+    for _ in range(rows):
+        date = start + dt.timedelta(days=rng.randrange(365))
+        posted = date + dt.timedelta(days=rng.randrange(4))
+        location = rng.choice(LOCATIONS)
+        merchant = rng.choice(merchants)
+        amount = round(rng.lognormvariate(3, 1.2), 2)
+        currency_foreign = FOREIGN_CURRENCIES.get(location[-2:])
+        amount_foreign = round(amount * rng.uniform(0.5, 110), 2)
+        yield [
+            date.strftime("%d %b %Y"),
+            posted.strftime("%d %b %Y"),
+            f"{merchant}  {location}",
+            currency_foreign,
+            amount_foreign if currency_foreign else None,
+            "SGD",
+            amount,
+        ]
+    yield []
+    yield ["Total", None, None, None, None, None, None]
+
+
+def write_xls(fpath: Path, rows) -> None:
+    """BIFF8 workbook, the format the bank actually exports"""
+    import xlwt
+
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet("Sheet1")
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            if value is not None:
+                ws.write(i, j, value)
+    wb.save(str(fpath))
+
+
+def write_xlsx(fpath: Path, rows) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    for row in rows:
+        ws.append(row)
+    wb.save(fpath)
+
+
+def fits_format(fmt: str, rows: int) -> bool:
+    """Whether a statement of rows transactions fits in one sheet of fmt"""
+    # preamble, header, blank line and total row
+    return fmt != "xls" or rows + len(PREAMBLE_ROWS) + 3 <= XLS_MAX_ROWS
+
+
+WRITERS = {".xls": write_xls, ".xlsx": write_xlsx}
+
+
+def generate_statement(
+    fpath: Path, rows: int, seed: int = 0, start: dt.date = dt.date(2023, 1, 1)
+) -> Path:
+    """Writes a synthetic statement, as xls or xlsx by the suffix of fpath"""
+    writer = WRITERS.get(fpath.suffix)
+    if writer is None:
+        raise ValueError(f"unsupported statement format; {fpath=}")
+    if not fits_format(fpath.suffix[1:], rows):
+        raise ValueError(f"{rows=} does not fit in one xls sheet")
+    writer(fpath, iter_statement_rows(rows, seed=seed, start=start))
+    return fpath
+
+
+def get_statement(workdir: Path, rows: int, seed: int = 0, fmt: str = "xls") -> Path:
+    workdir.mkdir(parents=True, exist_ok=True)
+    fpath = workdir / f"CC_TXN_History_bench_{rows}_{seed}.{fmt}"
+    if not fpath.is_file():
+        lg.info(f"generating {rows} row {fmt} statement ...")
+        generate_statement(fpath, rows, seed=seed)
+    return fpath
+
+
+class BenchReader(UobExcelReader):
+    """Reader whose category memo is empty and never saved
+
+    Synthetic merchants stay out of the user's memo, and every run measures
+    categorization from scratch.
+    """
+
+    def get_memo(self) -> CategoryMemo:
+        return CategoryMemo(None, version="bench")
+
+
+def bench_statement(fpath: Path, rows: int, trace_memory: bool = False) -> list[dict]:
+    clock = Clock(rows, trace_memory=trace_memory)
+    reader = BenchReader(fpath=fpath, cleanup=False)
+
+    df = clock(
+        "read_excel",
+        pd.read_excel,
+        fpath,
+        skiprows=list(np.arange(0, 9)),
+        header=0,
+    )
+    clock("drop_na_with_threshold", reader.drop_na_with_threshold, df)
+    del df
+
+    df = clock("read_data", reader.read_data, fpath)
+    # the config snapshot caches its matcher, so build a fresh one to time it
+    clock("build_matcher", CategoryMatcher, get_config()["category_mapper"])
+    descriptions = df["description"].unique()
+    clock("categorize_descriptions", reader.categorize_descriptions, descriptions)
+    df = clock("categorize", reader.categorize, df)
+    df["date_transacted"] = clock(
+        "to_datetime", pd.to_datetime, df["date_transacted"], format=reader.dt_format
+    )
+    reader.df = df
+
+    viewer = UobExcelViewer(reader)
+    clock("display_data_qualified", viewer.display_data_qualified)
+    clock("display_data_from_category", viewer.display_data_from_category, 3)
+    clock("display_data_biggest", viewer.display_data_biggest)
+    clock("parse_data", reader.parse_data, fpath)
+    return clock.results
+
+
+def measure_startup(runs: int = 5, budget_ms: float = STARTUP_BUDGET_MS) -> dict:
+    """Times `cli.py config path` in fresh interpreters against the budget
+
+    The command fails if it imported pandas, numpy or tomlkit.
+    """
+    cwd = Path(__file__).parent.parent
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        sp = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=cwd,
+            capture_output=True,
+            encoding="utf-8",
+        )
+        timings.append((time.perf_counter() - t0) * 1000)
+        if sp.returncode != 0:
+            raise RuntimeError(f"startup check failed; {sp.stderr.strip()}")
+    median_ms = statistics.median(timings)
+    lg.info(f"[bench] startup = {median_ms:.1f}ms; {budget_ms=}")
+    return {
+        "runs": runs,
+        "median_ms": median_ms,
+        "min_ms": min(timings),
+        "budget_ms": budget_ms,
+        "within_budget": median_ms <= budget_ms,
+    }
+
+
+def run(
+    sizes: list[int],
+    workdir: Path,
+    seed: int = 0,
+    trace_memory: bool = True,
+    formats: list[str] = FORMATS,
+) -> dict:
+    results = []
+    for fmt in formats:
+        for rows in sizes:
+            if not fits_format(fmt, rows):
+                lg.warning(f"[bench] skipping {fmt} at {rows=}; over one sheet")
+                continue
+            fpath = get_statement(workdir, rows, seed=seed, fmt=fmt)
+            lg.info(f"[bench] format={fmt}")
+            timed = bench_statement(fpath, rows)
+            if trace_memory:
+                traced = bench_statement(fpath, rows, trace_memory=True)
+                for result, traced_result in zip(timed, traced):
+                    result["peak_bytes"] = traced_result["peak_bytes"]
+            for result in timed:
+                result["format"] = fmt
+            results.extend(timed)
+    return {
+        "version": get_latest_git_tag(),
+        "created": get_time(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog=f"{APP_NAME}.bench")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--workdir", type=Path, default=Path("bench_data"))
+    parser.add_argument("--out", type=Path, default=Path("bench_output.json"))
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the peak memory runs"
+    )
+    parser.add_argument(
+        "--startup", action="store_true", help="also check the CLI startup budget"
+    )
+    args = parser.parse_args(argv)
+
+    create_app()
+    report = run(
+        args.rows,
+        args.workdir,
+        seed=args.seed,
+        trace_memory=not args.no_memory,
+        formats=args.formats,
+    )
+    if args.startup:
+        report["startup"] = measure_startup()
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    lg.info(f"saved benchmark results to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# config sections which change the parsed frame
+CONFIG_SECTIONS = ["parser_settings", "category_mapper", "qualifications_table"]
+# config sections which change the category of a description
+CATEGORY_SECTIONS = ["category_mapper", "qualifications_table"]
+
+
+def hash_file(fpath: Path, chunk_size: int = 1_048_576) -> str:
+    h = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_bytes(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def hash_config(cfg, sections: list[str] = CONFIG_SECTIONS) -> str:
+    subset = {k: cfg.get(k) for k in sections}
+    dump = json.dumps(subset, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """Parsed statement frames stored as parquet, keyed by content and config
+
+    Entries are touched on every hit, so the modified time doubles as the
+    last access time and the oldest entries are evicted first once the cache
+    grows beyond max_bytes.
+    """
+
+    suffix: str = ".parquet"
+
+    def __init__(self, dirpath: Path, max_bytes: int = 268_435_456) -> None:
+        self.dirpath = Path(dirpath).expanduser()
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_config(cls, cfg) -> Optional["ParseCache"]:
+        if not cfg.get("parse_cache", True):
+            return None
+        dirpath = Path(cfg["output_dir"]).expanduser() / ".cache" / "parsed"
+        max_bytes = int(cfg.get("parse_cache_max_mb", 256)) * 1_048_576
+        return cls(dirpath, max_bytes=max_bytes)
+
+    @staticmethod
+    def make_key(content_hash: str, cfg, *extra: str) -> str:
+        config_hash = getattr(cfg, "parser_hash", None) or hash_config(cfg)
+        h = hashlib.sha256(content_hash.encode("utf-8"))
+        h.update(config_hash.encode("utf-8"))
+        for x in extra:
+            h.update(x.encode("utf-8"))
+        return h.hexdigest()
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.dirpath / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        fpath = self.get_entry_path(key)
+        if not fpath.is_file():
+            return None
+        try:
+            df = pd.read_parquet(fpath)
+        except Exception as e:
+            lg.warning(f"dropping unreadable cache entry {fpath.name}; {e=}")
+            fpath.unlink(missing_ok=True)
+            return None
+        os.utime(fpath)
+        lg.debug(f"parse cache hit {key[:12]}")
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> Optional[Path]:
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        fpath = self.get_entry_path(key)
+        # per process, since batch workers may put the same key at the same time
+        tmp_fpath = fpath.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            df.to_parquet(tmp_fpath)
+        except ImportError as e:
+            lg.warning(f"parse cache disabled; {e}")
+            return None
+        os.replace(tmp_fpath, fpath)
+        self.evict()
+        return fpath
+
+    def evict(self) -> int:
+        entries = []
+        total = 0
+        with os.scandir(self.dirpath) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another process in the meantime
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            lg.debug(f"parse cache evicted {removed} entries")
+        return removed
+
+    def clear(self) -> None:
+        if not self.dirpath.is_dir():
+            return
+        for fpath in self.dirpath.glob(f"*{self.suffix}"):
+            fpath.unlink()
+
+
+class CategoryMemo:
+    """Persistent memo from description to (item, key_code, qualified)
+
+    Card descriptions repeat from month to month, so only descriptions the
+    memo has not seen go through the matcher. The memo is versioned by the
+    hash of the category_mapper and qualifications_table and starts empty
+    when either changes. Entries are kept in recency order and the least
+    recently used are evicted beyond max_entries. The file is only written
+    when descriptions were added, merged with whatever other processes saved
+    in the meantime.
+    """
+
+    def __init__(
+        self, fpath: Optional[Path], version: str, max_entries: int = 100_000
+    ) -> None:
+        self.fpath = None if fpath is None else Path(fpath).expanduser()
+        self.version = version
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[str, int, bool]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # entries added since the last save
+        self.added = 0
+        self.load()
+
+    @classmethod
+    def from_config(cls, cfg) -> "CategoryMemo":
+        """Memo in output_dir; kept in memory only when category_memo is off"""
+        fpath = None
+        if cfg.get("category_memo", True):
+            fpath = Path(cfg["output_dir"]).expanduser() / ".cache" / "categories.json"
+        version = hash_config(cfg, sections=CATEGORY_SECTIONS)
+        max_entries = int(cfg.get("category_memo_max_entries", 100_000))
+        return cls(fpath, version, max_entries=max_entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def read_entries(self) -> OrderedDict[str, tuple[str, int, bool]]:
+        entries = OrderedDict()
+        if self.fpath is None or not self.fpath.is_file():
+            return entries
+        try:
+            with open(self.fpath, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            lg.warning(f"dropping unreadable category memo; {e=}")
+            return entries
+        if data.get("version") != self.version:
+            lg.debug("category memo is out of date with the config; starting over")
+            return entries
+        for description, item, key_code, qualified in data["entries"]:
+            entries[description] = (item, key_code, qualified)
+        return entries
+
+    def load(self) -> None:
+        self.entries = self.read_entries()
+
+    def save(self) -> None:
+        if self.fpath is None or not self.added:
+            return
+        # batch workers each save their own memo; keep what the others
+        # added since this one was loaded, as the least recently used
+        merged = OrderedDict(
+            (k, v) for k, v in self.read_entries().items() if k not in self.entries
+        )
+        merged.update(self.entries)
+        self.entries = merged
+        self.evict()
+        self.fpath.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": self.version,
+            "entries": [[k, *v] for k, v in self.entries.items()],
+        }
+        # per process, since batch workers may save at the same time
+        tmp_fpath = self.fpath.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_fpath, "w") as f:
+            f.write(json.dumps(data))
+        os.replace(tmp_fpath, self.fpath)
+        self.added = 0
+
+    def evict(self) -> int:
+        removed = 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            removed += 1
+        if removed:
+            lg.debug(f"category memo evicted {removed} entries")
+        return removed
+
+    def resolve(
+        self,
+        descriptions: pd.Series,
+        compute: Callable[[Sequence[str]], pd.DataFrame],
+    ) -> pd.DataFrame:
+        """item, key_code and qualified columns for every description
+
+        Each distinct description is looked up once; `compute` is called with
+        the ones missing from the memo and returns those columns for them.
+        Rows without a description are treated as an empty description, so
+        they fall through to the default key code.
+        """
+        codes, uniques = pd.factorize(descriptions.fillna(""))
+        uniques = list(uniques)
+        is_hit = np.array([d in self.entries for d in uniques], dtype=bool)
+        missing = [d for d, hit in zip(uniques, is_hit) if not hit]
+        if missing:
+            computed = compute(missing)
+            for description, item, key_code, qualified in zip(
+                missing,
+                computed["item"],
+                computed["key_code"],
+                computed["qualified"],
+            ):
+                self.entries[description] = (item, int(key_code), bool(qualified))
+            self.added += len(missing)
+        for description in uniques:
+            self.entries.move_to_end(description)
+        rows = [self.entries[d] for d in uniques]
+        self.evict()
+
+        n_hits = len(uniques) - len(missing)
+        self.hits += n_hits
+        self.misses += len(missing)
+        if uniques:
+            row_hits = int(np.bincount(codes, minlength=len(uniques))[is_hit].sum())
+            lg.info(
+                f"category memo hit {n_hits}/{len(uniques)} descriptions"
+                f" ({n_hits / len(uniques):.1%}), {row_hits / len(codes):.1%} of rows"
+            )
+
+        items, key_codes, qualified = zip(*rows) if rows else ((), (), ())
+        return pd.DataFrame(
+            {
+                "item": np.array(items, dtype=object)[codes],
+                "key_code": np.array(key_codes, dtype="int64")[codes],
+                "qualified": np.array(qualified, dtype=bool)[codes],
+            },
+            index=descriptions.index,
+        )
@@ -0,0 +1,80 @@
+from collections import deque
+from typing import Iterable, Mapping
+
+import pandas as pd
+
+
+class CategoryMatcher:
+    """Assigns key codes to merchant items with an Aho-Corasick automaton
+
+    Keys from the category_mapper are matched as plain substrings, not regexes.
+    When several keys match an item, the key declared last in the mapper wins,
+    the same precedence the mapper has always had.
+    """
+
+    def __init__(self, mapper: Mapping[str, int], default: int = 1) -> None:
+        self.default = default
+        self.keys = list(mapper.keys())
+        self.codes = [int(v) for v in mapper.values()]
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        # highest precedence (declaration index) of any key ending at a state
+        self.output: list[int] = [-1]
+        self.build()
+
+    def build(self) -> None:
+        for precedence, key in enumerate(self.keys):
+            state = 0
+            for char in key:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(-1)
+                state = nxt
+            self.output[state] = max(self.output[state], precedence)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.output[nxt] = max(self.output[nxt], self.output[self.fail[nxt]])
+
+    def find(self, text: str) -> int:
+        """Declaration index of the highest precedence key in text, or -1"""
+        goto, fail, output = self.goto, self.fail, self.output
+        best = -1
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] > best:
+                best = output[state]
+        return best
+
+    def match(self, text: str) -> int:
+        """Returns the key code of the highest precedence key found in text"""
+        best = self.find(text)
+        if best < 0:
+            return self.default
+        return self.codes[best]
+
+    def match_many(self, texts: Iterable[str]) -> dict[str, int]:
+        return {text: self.match(text) for text in texts}
+
+    def unmatched(self, texts: Iterable[str]) -> list[str]:
+        """Texts that no key matches, which fall through to the default"""
+        return [text for text in texts if self.find(text) < 0]
+
+    def assign(self, items: pd.Series) -> pd.Series:
+        """Key codes for every row, matching each distinct item only once"""
+        lookup = self.match_many(items.dropna().unique())
+        return items.map(lookup).fillna(self.default).astype("int64")
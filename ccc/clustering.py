@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from .categorizer import CategoryMatcher
+from .money import format_minor, get_minor_units
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+NGRAM_SIZE = 3
+# pairs generated or verified per block, which bounds the working memory
+BLOCK_PAIRS = 2_000_000
+
+
+def normalize_items(items: pd.Series) -> pd.Series:
+    """Merchant names without store numbers, punctuation or case"""
+    return (
+        items.astype(str)
+        .str.upper()
+        .str.replace(r"[^A-Z&]+", " ", regex=True)
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def iter_blocks(counts: np.ndarray, block_size: int) -> Iterator[slice]:
+    """Consecutive slices of counts, each summing to about block_size"""
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        base = ends[start - 1] if start else 0
+        stop = int(np.searchsorted(ends, base + block_size, "right"))
+        stop = max(stop, start + 1)
+        yield slice(start, stop)
+        start = stop
+
+
+def unique_sorted(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct keys; sorting beats hashing for large int arrays"""
+    keys = np.sort(keys)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+
+class NgramIndex:
+    """Character n-gram inverted index over distinct names
+
+    Every name is a set of n-grams weighted by inverse document frequency
+    and scaled to unit length, so the dot product of two names is their
+    cosine similarity. Entries are kept sorted by name, and within a name
+    from the rarest n-gram to the most common.
+
+    `similar_pairs` uses prefix filtering: two names scoring at least the
+    threshold must share one of the rare n-grams at the front of each name,
+    so only the postings of those n-grams produce candidate pairs, and
+    common n-grams never pair every name with every other. Candidates are
+    then scored exactly with vectorized lookups.
+
+    A posting longer than max_posting, such as an n-gram of a merchant with
+    thousands of store variants, pairs each name only with the next `window`
+    names in its posting. Names are expected in sorted order, so the
+    variants stay connected through that chain, and the number of pairs
+    grows linearly instead of quadratically.
+    """
+
+    def __init__(self, names: list[str], n: int = NGRAM_SIZE) -> None:
+        self.names = names
+        self.n = n
+        grams_per_name = [self.get_ngrams(name) for name in names]
+        lengths = np.array([len(g) for g in grams_per_name], dtype=np.int64)
+        flat = [g for grams in grams_per_name for g in grams]
+        codes, vocab = pd.factorize(pd.Series(flat, dtype=object))
+        self.n_grams = len(vocab)
+
+        item = np.repeat(np.arange(len(names)), lengths)
+        doc_freq = np.bincount(codes, minlength=self.n_grams)
+        idf = np.log((1 + len(names)) / (1 + doc_freq)) + 1
+        weight = idf[codes]
+        norms = np.sqrt(np.bincount(item, weights=weight**2, minlength=len(names)))
+        weight = weight / norms[item]
+
+        # rarest n-grams first, ties broken by code for a global order
+        rank = np.empty(self.n_grams, dtype=np.int64)
+        rank[np.lexsort((np.arange(self.n_grams), doc_freq))] = np.arange(self.n_grams)
+        order = np.lexsort((rank[codes], item))
+        self.item = item[order]
+        self.gram = codes[order].astype(np.int64)
+        self.weight = weight[order]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.lengths = lengths
+        self.norms = norms
+        # hashed (name, n-gram) keys, to find the entries shared by a pair
+        self.entry_index = pd.Index(self.item * self.n_grams + self.gram)
+
+    def get_ngrams(self, name: str) -> set[str]:
+        padded = f" {name} "
+        return {padded[i : i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def get_prefix_mask(self, threshold: float) -> np.ndarray:
+        """Entries whose suffix, from that entry on, can still reach threshold"""
+        squares = self.weight**2
+        cumulative = np.cumsum(squares[::-1])[::-1]
+        item_end = self.offsets[1:][self.item]
+        after_item = np.append(cumulative, 0.0)[item_end]
+        suffix_norm = np.sqrt(np.maximum(cumulative - after_item, 0.0))
+        return suffix_norm >= threshold - 1e-9
+
+    def candidate_pairs(
+        self, threshold: float, max_posting: int, window: int
+    ) -> np.ndarray:
+        """Pairs of names sharing a prefix n-gram, as sorted i * n + j keys"""
+        mask = self.get_prefix_mask(threshold)
+        order = np.argsort(self.gram[mask], kind="stable")
+        gram = self.gram[mask][order]
+        item = self.item[mask][order]
+        if not len(gram):
+            return np.empty(0, dtype=np.int64)
+
+        starts = np.flatnonzero(np.r_[True, gram[1:] != gram[:-1]])
+        sizes = np.diff(np.append(starts, len(gram)))
+        long = sizes > max_posting
+        if long.any():
+            lg.debug(f"{long.sum()} n-grams shared by too many names; windowed")
+        position = np.arange(len(gram)) - np.repeat(starts, sizes)
+        # each entry pairs with the entries after it in the same posting
+        later = np.repeat(sizes, sizes) - position - 1
+        windowed = np.repeat(long, sizes)
+        later[windowed] = np.minimum(later[windowed], window)
+
+        n_names = len(self.names)
+        parts = []
+        for block in iter_blocks(later, BLOCK_PAIRS):
+            counts = later[block]
+            left = np.repeat(np.arange(block.start, block.stop), counts)
+            offset = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            right = left + 1 + offset
+            i = np.minimum(item[left], item[right])
+            j = np.maximum(item[left], item[right])
+            parts.append(unique_sorted(i * n_names + j))
+        return unique_sorted(np.concatenate(parts))
+
+    def score(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """Cosine similarity of names i and j, pairwise"""
+        # look up the n-grams of the shorter name of each pair in the other
+        swap = self.lengths[i] > self.lengths[j]
+        i, j = np.where(swap, j, i), np.where(swap, i, j)
+        scores = np.zeros(len(i))
+        for block in iter_blocks(self.lengths[i], BLOCK_PAIRS):
+            bi, bj = i[block], j[block]
+            counts = self.lengths[bi]
+            pair = np.repeat(np.arange(len(bi)), counts)
+            entry = np.repeat(self.offsets[bi], counts) + (
+                np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            )
+            wanted = bj[pair] * self.n_grams + self.gram[entry]
+            found = self.entry_index.get_indexer(wanted)
+            product = np.where(found >= 0, self.weight[entry] * self.weight[found], 0.0)
+            scores[block] = np.bincount(pair, weights=product, minlength=len(bi))
+        return scores
+
+    def similar_pairs(
+        self, threshold: float = 0.6, max_posting: int = 100, window: int = 10
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pairs of names with cosine similarity of at least threshold"""
+        keys = self.candidate_pairs(threshold, max_posting, window)
+        i, j = np.divmod(keys, len(self.names))
+        # the shared weight is at most the smaller norm, so the norms of a
+        # similar pair are within a factor of threshold of each other
+        ratio = np.minimum(self.norms[i], self.norms[j]) / np.maximum(
+            self.norms[i], self.norms[j]
+        )
+        i, j = i[ratio >= threshold], j[ratio >= threshold]
+        scores = self.score(i, j)
+        keep = scores >= threshold
+        lg.debug(f"{keep.sum()} of {len(keys)} candidate pairs are similar")
+        return i[keep], j[keep], scores[keep]
+
+
+def connected_components(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Component label of each node, the lowest node id in its component"""
+    labels = np.arange(n)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, labels[i], low)
+        np.minimum.at(labels, labels[j], low)
+        # pointer jumping until every node points at its root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+@dataclass
+class Proposal:
+    """A category_mapper key proposed for a cluster of merchant items"""
+
+    key: str
+    spend: int
+    count: int
+    items: list[str]
+    covered: int
+    conflicts: int = 0
+
+    def to_toml(self, key_code: int) -> str:
+        note = f"${format_minor(self.spend)} over {self.count} rows"
+        note += f", {self.covered}/{len(self.items)} items"
+        if self.conflicts:
+            note += f", also matches {self.conflicts} categorized items"
+        return f"{json.dumps(self.key)} = {key_code}  # {note}"
+
+
+def get_common_key(items: list[str], min_length: int = 3) -> str:
+    """Longest common prefix of the items, or the first word of the first"""
+    key = os.path.commonprefix(items).rstrip(" *-#/.,")
+    if len(key) >= min_length:
+        return key
+    words = items[0].split()
+    return words[0] if words else items[0]
+
+
+class MerchantClusterer:
+    """Groups uncategorized items into merchant clusters ranked by spend
+
+    Items that no category_mapper key matches are normalized and the
+    distinct names are clustered by n-gram similarity. Each cluster yields
+    a proposed key, the longest prefix its items share, for someone to
+    review and paste into the config.
+    """
+
+    def __init__(
+        self,
+        matcher: CategoryMatcher,
+        threshold: float = 0.6,
+        max_posting: int = 100,
+        window: int = 10,
+    ) -> None:
+        self.matcher = matcher
+        self.threshold = threshold
+        self.max_posting = max_posting
+        self.window = window
+
+    def get_uncategorized(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Spend and row count per distinct uncategorized item"""
+        frame = pd.DataFrame(
+            {"item": df["item"].astype(str), "spend": get_minor_units(df)}
+        )
+        totals = frame.groupby("item", sort=False)["spend"].agg(["sum", "size"])
+        unmatched = self.matcher.unmatched(totals.index)
+        totals = totals.loc[unmatched]
+        return totals.rename(columns={"sum": "spend", "size": "count"})
+
+    def cluster(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Uncategorized items with their normalized name and cluster label"""
+        items = self.get_uncategorized(df).reset_index()
+        items["name"] = normalize_items(items["item"])
+        # names of only digits and punctuation say nothing about the merchant
+        items = items[items["name"] != ""].reset_index(drop=True)
+        codes, names = pd.factorize(items["name"], sort=True)
+        index = NgramIndex(list(names))
+        i, j, _ = index.similar_pairs(self.threshold, self.max_posting, self.window)
+        labels = connected_components(len(names), i, j)
+        items["cluster"] = labels[codes]
+        lg.info(
+            f"{len(items)} uncategorized items, {len(names)} distinct names, "
+            f"{len(np.unique(labels))} clusters"
+        )
+        return items
+
+    def propose(
+        self, df: pd.DataFrame, top: Optional[int] = 20, min_spend: int = 0
+    ) -> list[Proposal]:
+        """Proposed keys for the clusters with the largest spend
+
+        Clusters that yield the same key are proposed once, together.
+        """
+        items = self.cluster(df).sort_values("spend", ascending=False)
+        members = items.groupby("cluster", sort=False)["item"].agg(list)
+        items["key"] = items["cluster"].map(members.map(get_common_key))
+        keys = items.groupby("key", sort=False).agg(
+            spend=("spend", "sum"), count=("count", "sum"), items=("item", list)
+        )
+        keys = keys[keys["spend"] >= min_spend]
+        keys = keys.sort_values("spend", ascending=False).head(top)
+        categorized = pd.Index(df["item"].astype(str).unique())
+        categorized = categorized.difference(items["item"]).to_series()
+
+        proposals = []
+        for key, row in keys.iterrows():
+            proposals.append(
+                Proposal(
+                    key=key,
+                    spend=int(row["spend"]),
+                    count=int(row["count"]),
+                    items=row["items"],
+                    covered=sum(key in name for name in row["items"]),
+                    conflicts=int(categorized.str.contains(key, regex=False).sum()),
+                )
+            )
+        return proposals
+
+
+def format_proposals(proposals: list[Proposal], key_code: int = 1) -> str:
+    """Proposals as category_mapper lines, ready to review and paste"""
+    lines = ["[category_mapper]"]
+    lines += [proposal.to_toml(key_code) for proposal in proposals]
+    return "\n".join(lines)
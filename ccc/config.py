@@ -1,22 +1,38 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-
-import tomlkit as tmk
-from tomlkit import toml_file
-from tomlkit.toml_document import TOMLDocument
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Mapping, Optional
 
 from . import utils
 
+if TYPE_CHECKING:
+    from tomlkit.toml_document import TOMLDocument
+
+try:
+    import tomllib
+except ImportError:  # python < 3.11
+    tomllib = None
+
 APP_NAME = "ccc"
 
 
 class ConfigManager:
-    def __init__(self, dirpath: str = "~/Library/Preferences") -> None:
+    def __init__(
+        self, dirpath: str = "~/Library/Preferences", load: bool = True
+    ) -> None:
         self.app_name = APP_NAME
         self.dirpath = dirpath
         self.config_filepath = self.get_config_filepath()
         if not self.config_filepath.is_file():
             self.write_toml_file(self.config_filepath)
-        self.config = self.parse_config(self.config_filepath)
+        self.config = {}
+        if load:
+            self.config = self.parse_config(self.config_filepath)
 
     def get_config_dirpath(self) -> Path:
         dirpath = Path(self.dirpath).expanduser()
@@ -37,6 +53,8 @@ class ConfigManager:
 
     @staticmethod
     def parse_config(fpath) -> dict:
+        from tomlkit import toml_file
+
         tf = toml_file.TOMLFile(fpath)
         doc = tf.read()
         config = doc.unwrap()
@@ -58,6 +76,117 @@ class ConfigManager:
         """
         self.write_toml_file(self.config_filepath)
         self.config = self.parse_config(self.config_filepath)
+        clear_config()
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable view of one version of the config file
+
+    Structures derived from the config, such as the category matcher and
+    the qualification lookup, are built on first use and shared by every
+    module until the file changes on disk.
+    """
+
+    raw: Mapping[str, Any]
+    filepath: Path
+    mtime_ns: int
+    version: str
+
+    def __getitem__(self, key: str) -> Any:
+        return self.raw[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.raw
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+    @cached_property
+    def matcher(self):
+        from .categorizer import CategoryMatcher
+
+        return CategoryMatcher(self.raw["category_mapper"])
+
+    @cached_property
+    def qualifications(self) -> Mapping[int, bool]:
+        table = {int(k): bool(v) for k, v in self.raw["qualifications_table"].items()}
+        return MappingProxyType(table)
+
+    @cached_property
+    def qualified_lookup(self):
+        """Boolean array indexed by key_code, False for unknown codes"""
+        import numpy as np
+
+        lookup = np.zeros(max(self.qualifications, default=-1) + 1, dtype=bool)
+        for code, qualified in self.qualifications.items():
+            if code >= 0:
+                lookup[code] = qualified
+        return lookup
+
+    @cached_property
+    def exclusions(self) -> frozenset[str]:
+        return frozenset(self.raw.get("exclusions", []))
+
+    @cached_property
+    def parser_hash(self) -> str:
+        from .cache import hash_config
+
+        return hash_config(self.raw)
+
+
+def load_snapshot(filepath: Path) -> ConfigSnapshot:
+    st = os.stat(filepath)
+    with open(filepath, "rb") as f:
+        payload = f.read()
+    if tomllib is not None:
+        raw = tomllib.loads(payload.decode("utf-8"))
+    else:
+        import tomlkit as tmk
+
+        raw = tmk.parse(payload.decode("utf-8")).unwrap()
+    return ConfigSnapshot(
+        raw=MappingProxyType(raw),
+        filepath=filepath,
+        mtime_ns=st.st_mtime_ns,
+        version=hashlib.sha256(payload).hexdigest()[:16],
+    )
+
+
+_snapshot: Optional[ConfigSnapshot] = None
+_checked_at: float = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def get_config(reload_interval: float = 1.0) -> ConfigSnapshot:
+    """Returns the process-wide config snapshot
+
+    The config file is read once; afterwards its mtime is checked at most
+    every reload_interval seconds and a new snapshot is built if it changed.
+    """
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < reload_interval:
+        return _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            filepath = ConfigManager(load=False).config_filepath
+        else:
+            filepath = _snapshot.filepath
+            if not filepath.is_file():
+                ConfigManager.write_toml_file(filepath)
+        mtime_ns = os.stat(filepath).st_mtime_ns
+        if _snapshot is None or mtime_ns != _snapshot.mtime_ns:
+            _snapshot = load_snapshot(filepath)
+        _checked_at = now
+        return _snapshot
+
+
+def clear_config() -> None:
+    """Forgets the current snapshot so the next get_config reads the file"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
 
 
 class ConfigToml:
@@ -66,28 +195,51 @@ class ConfigToml:
         self.doc = self.init_doc()
 
     def write_to_file(self) -> Path:
+        from tomlkit import toml_file
+
         tf = toml_file.TOMLFile(self.config_filepath)
         tf.write(self.doc)
         print(f"wrote config to {self.config_filepath}")
         return self.config_filepath
 
-    def init_doc(self) -> TOMLDocument:
+    def init_doc(self) -> "TOMLDocument":
+        import tomlkit as tmk
+
         doc = tmk.document()
         doc.add(tmk.comment("Configuration file for CreditCardCompiler"))
         doc.add(tmk.nl())
 
         doc["display_columns"] = [
             "date_transacted",
-            "posting_status",
+            "item",
+            "amount",
             "key_code",
-            "tier1_qualified",
-            "short_description",
-            "amount_sgd",
         ]
         doc["number_of_top_big_purchases"] = 20
         doc["export_to_csv"] = False
         doc["exclusions"] = ["GIRO PAYMENT"]
         doc["output_dir"] = "~/Documents/ccc-parser/output"
+        doc["export_format"] = "parquet"
+        doc["export_dir"] = ""
+        doc["parse_cache"] = True
+        doc["parse_cache_max_mb"] = 256
+        doc["category_memo"] = True
+        doc["category_memo_max_entries"] = 100_000
+        doc["transaction_store"] = True
+        doc["compact_schema"] = False
+        doc["compact_strings"] = "category"
+        doc["async_logging"] = False
+        doc["log_queue_size"] = 10_000
+        doc["log_overflow"] = "drop"
+
+        rebate = tmk.table()
+        doc["rebate"] = rebate
+        rebate.add(tmk.comment("[minimum monthly spend, quarterly cashback] in SGD"))
+        rebate["tiers"] = [[500, 50], [1000, 100], [2000, 200]]
+        rebate["min_transactions"] = 5
+        rebate["quarter_start_month"] = 1
+        rebate.add(tmk.comment("months whose statements may still be fed in again"))
+        rebate["retain_months"] = 6
 
         parser = tmk.table()
         doc["parser_settings"] = parser
@@ -0,0 +1,209 @@
+import bisect
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .config import get_config
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+INDEX_VERSION = 1
+# directory mtimes this recent may still change within the same clock tick,
+# so such listings are not trusted on the next refresh
+RACY_WINDOW_NS = 2_000_000_000
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    path: Path
+    size: int
+    mtime_ns: int
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+@dataclass
+class DirectoryListing:
+    """One directory's files, valid while the directory mtime is unchanged"""
+
+    mtime_ns: int
+    files: list[tuple[str, int, int]] = field(default_factory=list)
+    subdirs: list[str] = field(default_factory=list)
+
+
+class DirectoryIndex:
+    """Name, size and mtime of every file under a directory
+
+    Each directory is listed with a single os.scandir pass and its listing is
+    reused for as long as the directory mtime stays the same, so a refresh of
+    an unchanged tree costs one stat per directory. Listings are persisted as
+    JSON so later runs start warm. Creating, renaming or removing a file
+    bumps the mtime of its directory; rewriting a file in place does not, so
+    the index suits write-once statement archives. Hidden directories are not
+    descended into unless include_hidden is set.
+    """
+
+    def __init__(
+        self,
+        dirpath: Path,
+        recursive: bool = False,
+        cache_dir: Optional[Path] = None,
+        include_hidden: bool = False,
+    ) -> None:
+        self.dirpath = Path(dirpath).expanduser()
+        self.recursive = recursive
+        self.include_hidden = include_hidden
+        self.index_path = None
+        if cache_dir is not None:
+            key = f"{self.dirpath}:{recursive}:{include_hidden}"
+            digest = hashlib.sha1(key.encode()).hexdigest()
+            self.index_path = Path(cache_dir).expanduser() / f"{digest[:16]}.json"
+        self.listings: dict[str, DirectoryListing] = self.load()
+        self.entries: list[tuple[int, str, str, int]] = []
+        self.is_stale = True
+
+    def load(self) -> dict[str, DirectoryListing]:
+        if self.index_path is None or not self.index_path.is_file():
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            lg.warning(f"ignoring unreadable index {self.index_path}; {e}")
+            return {}
+        if state.get("version") != INDEX_VERSION:
+            return {}
+        return {
+            rel: DirectoryListing(
+                d["mtime_ns"], [tuple(x) for x in d["files"]], d["subdirs"]
+            )
+            for rel, d in state["dirs"].items()
+        }
+
+    def save(self) -> None:
+        if self.index_path is None:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "version": INDEX_VERSION,
+            "root": str(self.dirpath),
+            "dirs": {
+                rel: {"mtime_ns": d.mtime_ns, "files": d.files, "subdirs": d.subdirs}
+                for rel, d in self.listings.items()
+            },
+        }
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.index_path)
+
+    def scan(self, rel: str, mtime_ns: int) -> DirectoryListing:
+        if time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            mtime_ns = -1
+        listing = DirectoryListing(mtime_ns)
+        with os.scandir(self.dirpath / rel) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if self.include_hidden or not entry.name.startswith("."):
+                        listing.subdirs.append(entry.name)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    listing.files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return listing
+
+    def refresh(self) -> "DirectoryIndex":
+        """Re-lists only the directories whose mtime changed"""
+        if not self.dirpath.is_dir():
+            raise NotADirectoryError(f"invalid {self.dirpath=}")
+        listings = {}
+        rescanned = 0
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            try:
+                mtime_ns = os.stat(self.dirpath / rel).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            listing = self.listings.get(rel)
+            if listing is None or listing.mtime_ns != mtime_ns:
+                listing = self.scan(rel, mtime_ns)
+                rescanned += 1
+            listings[rel] = listing
+            if self.recursive:
+                stack.extend(os.path.join(rel, name) for name in listing.subdirs)
+
+        if rescanned or listings.keys() != self.listings.keys():
+            lg.debug(f"index of {self.dirpath} re-listed {rescanned} directories")
+            self.listings = listings
+            self.is_stale = True
+            self.save()
+        if self.is_stale:
+            # plain tuples; FileEntry objects are only built for query results
+            self.entries = sorted(
+                (mtime_ns, name, rel, size)
+                for rel, listing in self.listings.items()
+                for name, size, mtime_ns in listing.files
+            )
+            self.is_stale = False
+        return self
+
+    def make_entry(self, row: tuple[int, str, str, int]) -> FileEntry:
+        mtime_ns, name, rel, size = row
+        return FileEntry(self.dirpath / rel / name, size, mtime_ns)
+
+    def find(self, pattern: str = "*") -> list[FileEntry]:
+        """Files whose name matches pattern, oldest first"""
+        return self.select(self.entries, pattern)
+
+    def select(self, rows, pattern: str) -> list[FileEntry]:
+        return [self.make_entry(r) for r in rows if fnmatch.fnmatch(r[1], pattern)]
+
+    def latest(self, pattern: str = "*") -> Optional[FileEntry]:
+        for row in reversed(self.entries):
+            if fnmatch.fnmatch(row[1], pattern):
+                return self.make_entry(row)
+        return None
+
+    def oldest(self, pattern: str = "*") -> Optional[FileEntry]:
+        for row in self.entries:
+            if fnmatch.fnmatch(row[1], pattern):
+                return self.make_entry(row)
+        return None
+
+    def since(self, when: datetime | float, pattern: str = "*") -> list[FileEntry]:
+        """Files modified at or after when, oldest first"""
+        if isinstance(when, datetime):
+            when = when.timestamp()
+        start = bisect.bisect_left(self.entries, (int(when * 1e9),))
+        return self.select(self.entries[start:], pattern)
+
+
+_indexes: dict[tuple[Path, bool], DirectoryIndex] = {}
+
+
+def get_index(dirpath: Path, recursive: bool = False) -> DirectoryIndex:
+    """Refreshed index of dirpath, shared within the process
+
+    Indexes are persisted under output_dir/.cache/index.
+    """
+    dirpath = Path(dirpath).expanduser()
+    index = _indexes.get((dirpath, recursive))
+    if index is None:
+        cache_dir = Path(get_config()["output_dir"]).expanduser() / ".cache" / "index"
+        index = DirectoryIndex(dirpath, recursive=recursive, cache_dir=cache_dir)
+        _indexes[(dirpath, recursive)] = index
+    return index.refresh()
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .schema import PARSED_SCHEMA_VERSION
+from .utils import get_time, write_output_log_filepath
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+EXPORT_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+METADATA_PREFIX = "ccc."
+
+
+def make_metadata(cfg, source_name: str = "") -> dict[str, str]:
+    """Provenance embedded in every export, so consumers can trust the schema"""
+    return {
+        f"{METADATA_PREFIX}schema_version": PARSED_SCHEMA_VERSION,
+        f"{METADATA_PREFIX}config_version": getattr(cfg, "version", ""),
+        f"{METADATA_PREFIX}parser_hash": getattr(cfg, "parser_hash", ""),
+        f"{METADATA_PREFIX}source": source_name,
+        f"{METADATA_PREFIX}exported": get_time(),
+    }
+
+
+def get_export_dir(cfg) -> Path:
+    dirpath = cfg.get("export_dir", "")
+    if not dirpath:
+        return Path(cfg["output_dir"]).expanduser() / "exports"
+    return Path(dirpath).expanduser()
+
+
+def to_arrow_table(df: pd.DataFrame, metadata: dict[str, str]):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    merged = dict(table.schema.metadata or {})
+    merged.update({k.encode(): v.encode() for k, v in metadata.items()})
+    return table.replace_schema_metadata(merged)
+
+
+def write_parquet(df: pd.DataFrame, outpath: Path, metadata: dict[str, str]) -> None:
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow_table(df, metadata), outpath)
+
+
+def write_arrow(
+    df: pd.DataFrame,
+    outpath: Path,
+    metadata: dict[str, str],
+    chunksize: int = 65_536,
+) -> None:
+    """Uncompressed Arrow IPC file, which consumers can memory-map"""
+    import pyarrow as pa
+
+    table = to_arrow_table(df, metadata)
+    with pa.OSFile(str(outpath), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=chunksize):
+                writer.write_batch(batch)
+
+
+def write_csv(
+    df: pd.DataFrame,
+    outpath: Path,
+    metadata: dict[str, str],
+    chunksize: int = 65_536,
+) -> None:
+    """Streams df to CSV chunk by chunk; metadata goes to a JSON sidecar"""
+    with open(outpath, "w", newline="") as f:
+        for start in range(0, max(len(df), 1), chunksize):
+            chunk = df.iloc[start : start + chunksize]
+            chunk.to_csv(f, index=False, header=start == 0)
+    sidecar = {**metadata, f"{METADATA_PREFIX}dtypes": df.dtypes.astype(str).to_dict()}
+    with open(outpath.with_suffix(".json"), "w") as f:
+        json.dump(sidecar, f, indent=2)
+
+
+def export_frame(
+    df: pd.DataFrame,
+    cfg,
+    fmt: str = "parquet",
+    outpath: Optional[Path] = None,
+    source_name: str = "",
+) -> Path:
+    """Writes df as parquet, Arrow IPC or CSV and returns the file written
+
+    Columnar formats need pyarrow; without it the export falls back to CSV.
+    Files are written under a temporary name and renamed into place.
+    """
+    if fmt not in EXPORT_SUFFIXES:
+        raise ValueError(f"unknown {fmt=}; expected one of {list(EXPORT_SUFFIXES)}")
+    if fmt != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            lg.warning(f"pyarrow is not installed; exporting csv instead of {fmt}")
+            fmt = "csv"
+    if outpath is None:
+        stem = f"{Path(source_name).stem}_{get_time()}" if source_name else get_time()
+        outpath = get_export_dir(cfg) / f"{stem}{EXPORT_SUFFIXES[fmt]}"
+    outpath = Path(outpath)
+    outpath.parent.mkdir(parents=True, exist_ok=True)
+
+    metadata = make_metadata(cfg, source_name)
+    tmp_path = outpath.with_name(f".{outpath.name}.tmp")
+    match fmt:
+        case "parquet":
+            write_parquet(df, tmp_path, metadata)
+        case "arrow":
+            write_arrow(df, tmp_path, metadata)
+        case "csv":
+            write_csv(df, tmp_path, metadata)
+            os.replace(tmp_path.with_suffix(".json"), outpath.with_suffix(".json"))
+    os.replace(tmp_path, outpath)
+    write_output_log_filepath(lg, outpath)
+    return outpath
+
+
+def read_csv_export(fpath: Path, dtypes: dict[str, str]) -> pd.DataFrame:
+    """Reads a CSV export back with the dtypes recorded in its sidecar"""
+    dates = {c: d for c, d in dtypes.items() if d.startswith("datetime64")}
+    others = {c: d for c, d in dtypes.items() if c not in dates}
+    df = pd.read_csv(fpath, dtype=others, parse_dates=list(dates))
+    # parse_dates yields its own resolution; restore the exported one
+    return df.astype(dates)
+
+
+def read_export(fpath: Path) -> tuple[pd.DataFrame, dict[str, str]]:
+    """Loads an export and its ccc metadata without a parse step
+
+    Columns of Arrow IPC and parquet exports come back as pd.ArrowDtype, so
+    the frame shares the Arrow buffers instead of converting them to numpy.
+    Arrow IPC files are memory-mapped, so their data is not copied at all;
+    parquet is decoded into memory once. CSV exports are read back with the
+    dtypes recorded in their JSON sidecar.
+    """
+    fpath = Path(fpath)
+    match fpath.suffix:
+        case ".arrow":
+            import pyarrow as pa
+
+            source = pa.memory_map(str(fpath), "r")
+            table = pa.ipc.open_file(source).read_all()
+        case ".parquet":
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(fpath, memory_map=True)
+        case ".csv":
+            with open(fpath.with_suffix(".json"), "r") as f:
+                metadata = json.load(f)
+            dtypes = metadata.get(f"{METADATA_PREFIX}dtypes", {})
+            return read_csv_export(fpath, dtypes), metadata
+        case _:
+            raise ValueError(f"unknown export type; {fpath=}")
+    metadata = {
+        k.decode(): v.decode()
+        for k, v in (table.schema.metadata or {}).items()
+        if k.startswith(METADATA_PREFIX.encode())
+    }
+    return table.to_pandas(types_mapper=pd.ArrowDtype), metadata
+
+
+def test_csv_export_round_trip():
+    import tempfile
+
+    df = pd.DataFrame(
+        {
+            "date_transacted": pd.to_datetime(["2024-01-02", "2024-01-05"]),
+            "description": ["NTUC FAIRPRICE  SINGAPORE", "AMAZON  SEATTLE US"],
+            "currency_foreign": [None, "USD"],
+            "item": pd.Categorical(["NTUC FAIRPRICE", "AMAZON"]),
+            "amount": [45.1, 12.98],
+            "amount_foreign_cents": pd.array([None, 999], dtype="Int64"),
+            "key_code": pd.array([2, 3], dtype="int8"),
+            "qualified": [True, False],
+        }
+    )
+    with tempfile.TemporaryDirectory() as dirpath:
+        outpath = export_frame(df, {}, fmt="csv", outpath=Path(dirpath) / "export.csv")
+        result, metadata = read_export(outpath)
+    assert metadata[f"{METADATA_PREFIX}schema_version"] == PARSED_SCHEMA_VERSION
+    pd.testing.assert_frame_equal(result, df)
+    print(result.dtypes)
+
+
+if __name__ == "__main__":
+    test_csv_export_round_trip()
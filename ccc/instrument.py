@@ -0,0 +1,167 @@
+"""Lightweight spans for timing the parse, discovery and render stages
+
+    with span("parse_data", file=fpath.name) as sp:
+        df = ...
+        sp.rows = len(df)
+
+Spans nest per thread and finished top-level spans are kept in a bounded
+buffer which can be exported as JSON. Memory deltas are only recorded while
+tracemalloc is tracing, e.g. under `profile_session`, as tracing itself is
+expensive.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+APP_NAME = "ccc"
+
+
+@dataclass
+class Span:
+    name: str
+    start: float = 0.0
+    elapsed: float = 0.0
+    rows: Optional[int] = None
+    mem_delta: Optional[int] = None
+    attrs: dict = field(default_factory=dict)
+    children: list["Span"] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "elapsed": self.elapsed,
+            "rows": self.rows,
+            "mem_delta": self.mem_delta,
+            "attrs": self.attrs,
+            "children": [c.to_dict() for c in self.children],
+        }
+
+
+class NullSpan:
+    """Stands in for a span while the recorder is disabled"""
+
+    name: str = "null"
+    rows: Optional[int] = None
+    mem_delta: Optional[int] = None
+
+    @property
+    def attrs(self) -> dict:
+        return {}
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Recorder:
+    def __init__(self, maxlen: int = 1000, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.spans: deque[Span] = deque(maxlen=maxlen)
+        self._local = threading.local()
+
+    def get_stack(self) -> list[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, rows: Optional[int] = None, **attrs) -> Iterator[Span]:
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        stack = self.get_stack()
+        sp = Span(name, rows=rows, attrs=attrs)
+        tracing = tracemalloc.is_tracing()
+        mem0 = tracemalloc.get_traced_memory()[0] if tracing else 0
+        stack.append(sp)
+        sp.start = time.perf_counter()
+        try:
+            yield sp
+        finally:
+            sp.elapsed = time.perf_counter() - sp.start
+            if tracing and tracemalloc.is_tracing():
+                sp.mem_delta = tracemalloc.get_traced_memory()[0] - mem0
+            stack.pop()
+            if stack:
+                stack[-1].children.append(sp)
+            else:
+                self.spans.append(sp)
+            log = logging.getLogger(APP_NAME)
+            if log.isEnabledFor(logging.DEBUG):
+                rows = "" if sp.rows is None else f" rows={sp.rows}"
+                log.debug(f"[{name}]{rows} elapsed_time = {sp.elapsed:.4f}s")
+
+    def traced(self, name: str = ""):
+        """Decorator wrapping every call of a function in a span"""
+
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def to_dict(self) -> list[dict]:
+        return [sp.to_dict() for sp in self.spans]
+
+    def export_json(self, outpath: Path) -> Path:
+        with open(outpath, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return outpath
+
+    def reset(self) -> None:
+        self.spans.clear()
+
+
+recorder = Recorder()
+span = recorder.span
+traced = recorder.traced
+
+
+@contextmanager
+def profile_session(outdir: Path, top: int = 40) -> Iterator[cProfile.Profile]:
+    """Runs the block under cProfile and tracemalloc, dumping reports to outdir
+
+    Writes profile.pstats, profile.txt, tracemalloc.txt and spans.json.
+    """
+    outdir = Path(outdir).expanduser()
+    outdir.mkdir(parents=True, exist_ok=True)
+    tracemalloc.start(25)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        profiler.dump_stats(outdir / "profile.pstats")
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(top)
+        (outdir / "profile.txt").write_text(buf.getvalue())
+
+        lines = [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+        (outdir / "tracemalloc.txt").write_text("\n".join(lines) + "\n")
+        recorder.export_json(outdir / "spans.json")
+        logging.getLogger(APP_NAME).info(f"profile reports saved to {outdir}")
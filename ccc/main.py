@@ -1,17 +1,317 @@
-from . import models, views
-from .config import ConfigManager
+import argparse
+from pathlib import Path
+
+# keep imports here light; pandas and the parsers are imported by the
+# commands that need them so that `cli.py config ...` starts instantly
+from . import instrument
+from .app import AppContext, create_app
 
 APP_NAME = "ccc"
-cfg = ConfigManager().config
 
 
-def main():
-    model = models.UobExcelReader()
-    if model.df.empty:
-        fpath = models.FileManager().get_file_from_output()
-        model.parse(fpath=fpath, cleanup=False)
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=APP_NAME)
+    parser.add_argument("--debug", action="store_true", help="debug logging")
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="parse every statement export found, in parallel",
+    )
+    parser.add_argument(
+        "--since",
+        help="report from the transaction store, from this date or YYYY-MM",
+    )
+    parser.add_argument(
+        "--until",
+        help="report from the transaction store, up to this date or YYYY-MM",
+    )
+    parser.add_argument(
+        "--pdf",
+        metavar="PATH",
+        type=Path,
+        help="report on a PDF statement instead of the excel export",
+    )
+    parser.add_argument(
+        "--file",
+        metavar="PATH",
+        type=Path,
+        help="report on a statement of any supported format, detected by sniffing",
+    )
+    parser.add_argument(
+        "--rebate",
+        action="store_true",
+        help="update the rebate ledger and report cashback per quarter",
+    )
+    parser.add_argument(
+        "--export",
+        choices=["parquet", "arrow", "csv"],
+        help="also export the report frame in this format",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "markdown", "html"],
+        help="stream the report in this format instead of logging it",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        type=Path,
+        help="write the streamed report to PATH instead of stdout",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=50,
+        help="rows per page of the streamed report",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        type=Path,
+        help="dump cProfile, tracemalloc and span reports into DIR",
+    )
+    parser.add_argument(
+        "--spans-json",
+        metavar="PATH",
+        type=Path,
+        help="export the recorded stage spans as JSON",
+    )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="log the memory saved by the compact schema on the parsed frame",
+    )
+    parser.set_defaults(func=run_report)
+
+    subparsers = parser.add_subparsers(dest="command")
+    config_parser = subparsers.add_parser("config", help="inspect the config")
+    config_parser.add_argument(
+        "action", choices=["path", "show", "get", "reset"], default="show", nargs="?"
+    )
+    config_parser.add_argument("key", nargs="?", help="key for `config get`")
+    config_parser.set_defaults(func=run_config)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="ingest new statement downloads as they arrive"
+    )
+    watch_parser.add_argument("--dir", default="~/Downloads", help="folder to watch")
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        default=1.0,
+        help="seconds a download must stay unchanged before it is ingested",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="poll interval where inotify is unavailable",
+    )
+    watch_parser.set_defaults(func=run_watch)
+
+    classify_parser = subparsers.add_parser(
+        "classify", help="detect the bank and format of every file in a folder"
+    )
+    classify_parser.add_argument(
+        "dir", nargs="?", default="~/Downloads", help="folder to classify"
+    )
+    classify_parser.set_defaults(func=run_classify)
+
+    suggest_parser = subparsers.add_parser(
+        "suggest",
+        help="cluster uncategorized merchants and propose category_mapper keys",
+    )
+    suggest_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.6,
+        help="n-gram similarity for two merchant names to share a cluster",
+    )
+    suggest_parser.add_argument(
+        "--top", type=int, default=20, help="number of clusters to propose"
+    )
+    suggest_parser.add_argument(
+        "--key-code",
+        type=int,
+        default=1,
+        help="key code written for every proposed key",
+    )
+    suggest_parser.set_defaults(func=run_suggest)
+    return parser
+
+
+def parse_period(value: str, end: bool = False):
+    import pandas as pd
+
+    if value is None:
+        return None
+    if len(value) == 7:
+        period = pd.Period(value, freq="M")
+        return period.end_time if end else period.start_time
+    return pd.Timestamp(value)
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    ctx = create_app(debug=args.debug)
+    if args.profile:
+        with instrument.profile_session(args.profile):
+            args.func(ctx, args)
+    else:
+        args.func(ctx, args)
+    if args.spans_json:
+        instrument.recorder.export_json(args.spans_json)
+
+
+def run_config(ctx: AppContext, args: argparse.Namespace) -> None:
+    from .config import ConfigManager
+
+    match args.action:
+        case "path":
+            print(ctx.config.filepath)
+        case "show":
+            print(ctx.config.filepath.read_text())
+        case "get":
+            if not args.key:
+                raise SystemExit("usage: config get KEY[.SUBKEY]")
+            value = ctx.config.raw
+            for part in args.key.split("."):
+                value = value[part]
+            print(value)
+        case "reset":
+            ConfigManager().reset()
+
+
+def load_model(ctx: AppContext, args: argparse.Namespace):
+    """Model for the statements selected by the report options"""
+    from . import batch, models, store
+    from .utils import StatementNotFoundError
+
+    if args.since or args.until:
+        model = store.TransactionStoreReader(
+            store.TransactionStore.from_config(ctx.config),
+            start=parse_period(args.since),
+            end=parse_period(args.until, end=True),
+        )
+    elif args.pdf:
+        model = models.UobPdfReader(fpath=args.pdf, cleanup=False)
+    elif args.file:
+        from .registry import get_reader
+
+        model = get_reader(args.file, cleanup=False)
+    elif args.all:
+        model = batch.UobExcelBatchReader()
+        model.parse()
+    else:
+        model = models.UobExcelReader()
+        try:
+            model.df
+        except StatementNotFoundError:
+            fpath = models.FileManager().get_file_from_output()
+            model = models.UobExcelReader(fpath=fpath, cleanup=False)
+    return model
+
+
+def run_report(ctx: AppContext, args: argparse.Namespace) -> None:
+    if args.memory_report:
+        from . import schema
+
+        # the frame is compacted while it loads when compact_schema is on
+        with schema.measure_memory() as usages:
+            model = load_model(ctx, args)
+            df = model.df
+        log_memory_report(ctx, df, before=usages[-1] if usages else None)
+    else:
+        model = load_model(ctx, args)
+    if args.export:
+        from .export import export_frame
+
+        fpath = getattr(model, "fpath", None)
+        source_name = fpath.name if fpath else ""
+        export_frame(model.df, ctx.config, fmt=args.export, source_name=source_name)
+    display_report(ctx, args, model)
+
+
+def display_report(ctx: AppContext, args: argparse.Namespace, model) -> None:
+    from . import rebate, render, views
+
     uob = views.UobExcelViewer(model)
-    uob.display_data()
+    if args.format or args.output:
+        if args.output:
+            with open(args.output, "w") as f:
+                uob.render(render.make_sink(args.format or "text", f), args.page_size)
+            ctx.logger.info(f"report written to {args.output}")
+        else:
+            uob.render(render.make_sink(args.format), args.page_size)
+    else:
+        uob.display_data()
+    if args.rebate:
+        ledger = rebate.RebateLedger.from_config(ctx.config)
+        if ledger.update(model.df):
+            ledger.save()
+        ctx.logger.info(uob.display_rebate(ledger))
+
+
+def run_watch(ctx: AppContext, args: argparse.Namespace) -> None:
+    from . import registry, store, watcher
+
+    def on_statement(fpath: Path) -> None:
+        model = registry.get_reader(fpath)
+        df = model.df
+        if ctx.config.get("transaction_store", True) and not df.empty:
+            # report the statement period from the store, which also holds
+            # the overlapping transactions of earlier statements
+            model = store.TransactionStoreReader(
+                store.TransactionStore.from_config(ctx.config),
+                start=parse_period(args.since) or df["date_transacted"].min(),
+                end=parse_period(args.until, end=True),
+            )
+        display_report(ctx, args, model)
+
+    statement_watcher = watcher.StatementWatcher(
+        on_statement, dir_str=args.dir, settle=args.settle, interval=args.interval
+    )
+    try:
+        statement_watcher.run()
+    except KeyboardInterrupt:
+        ctx.logger.info("stopped watching")
+
+
+def run_classify(ctx: AppContext, args: argparse.Namespace) -> None:
+    from .registry import classify_dir
+
+    results = classify_dir(Path(args.dir))
+    width = max((len(r.fpath.name) for r in results), default=0)
+    for result in results:
+        parser_name = result.spec.name if result.spec else "-"
+        print(f"{result.fpath.name:<{width}}  {result.container:<7}  {parser_name}")
+
+
+def run_suggest(ctx: AppContext, args: argparse.Namespace) -> None:
+    from .clustering import MerchantClusterer, format_proposals
+
+    model = load_model(ctx, args)
+    clusterer = MerchantClusterer(ctx.config.matcher, threshold=args.threshold)
+    proposals = clusterer.propose(model.df, top=args.top)
+    if not proposals:
+        ctx.logger.info("every merchant is categorized")
+        return
+    print(format_proposals(proposals, key_code=args.key_code))
+
+
+def log_memory_report(ctx: AppContext, df, before=None) -> None:
+    """Logs the saving of the compact schema on df
+
+    `before` is the memory usage of df ahead of compaction when df is already
+    compact; otherwise df is compacted here.
+    """
+    from . import schema
+
+    if before is None:
+        strings = ctx.config.get("compact_strings", "category")
+        before, df = schema.memory_usage(df), schema.compact_frame(df, strings=strings)
+    report = schema.memory_report(before, schema.memory_usage(df))
+    ctx.logger.info(f"compact schema memory usage ({len(df)} rows):\n{report}")
 
 
 if __name__ == "__main__":
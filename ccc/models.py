@@ -1,17 +1,29 @@
+import io
+import logging
 import os
-import shutil
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
 import pandas as pd
-from .config import ConfigManager
-from .utils import LoggerManager, get_time, write_output_log_filepath
+from .app import create_app
+from .archive import StatementArchive
+from .cache import CategoryMemo, ParseCache, hash_bytes, hash_file
+from .categorizer import CategoryMatcher
+from .config import get_config
+from .discovery import FileEntry, get_index
+from .export import export_frame
+from .instrument import span, traced
+from .money import add_minor_units
+from .pdfreader import read_pdf_statement
+from .schema import PARSED_SCHEMA_VERSION, compact_from_config
+from .store import TransactionStore
+from .utils import StatementNotFoundError, StatementParseError
+from .xlreader import read_statement
 
 APP_NAME = "ccc"
-lg = LoggerManager(APP_NAME).getLogger()
-cfg = ConfigManager().config
+lg = logging.getLogger(APP_NAME)
 
 
 @dataclass
@@ -22,22 +34,33 @@ class FileTableRow:
 
     def __post_init__(self):
         self.filename = self.filepath.name
-        self.date_modified = pd.Timestamp(os.path.getmtime(self.filepath), unit="s")
+        if pd.isna(self.date_modified):
+            self.date_modified = pd.Timestamp(os.path.getmtime(self.filepath), unit="s")
+
+    @classmethod
+    def from_entry(cls, entry: FileEntry) -> "FileTableRow":
+        """Row from an index entry, without another stat of the file"""
+        return cls(entry.path, date_modified=pd.Timestamp(entry.mtime_ns, unit="ns"))
 
 
 class FileManager:
     def __init__(self, filepattern: str = "CC_TXN_History_*.xls") -> None:
         self.filepattern = filepattern
 
+    @traced("FileManager.get_file")
     def get_file(self) -> Path | None:
-        fpath = self.get_file_from_downloads(filepattern=self.filepattern)
+        try:
+            fpath = self.get_file_from_downloads(filepattern=self.filepattern)
+        except NotADirectoryError:
+            fpath = None
         if fpath is None:
             fpath = self.get_file_from_codebase(filepattern=self.filepattern)
         if fpath is None:
-            raise FileNotFoundError(f"no files found; {self.filepattern=}")
+            raise StatementNotFoundError(f"no files found; {self.filepattern=}")
         return fpath
 
     @staticmethod
+    @traced("FileManager.get_file_from_downloads")
     def get_file_from_downloads(
         dir_str="~/Downloads", filepattern: str = "CC_TXN_History_*.xls"
     ) -> Path | None:
@@ -52,6 +75,7 @@ class FileManager:
             return None
 
     @staticmethod
+    @traced("FileManager.get_file_from_codebase")
     def get_file_from_codebase(
         filepattern: str = "CC_TXN_History_*.xls",
     ) -> Path | None:
@@ -63,30 +87,78 @@ class FileManager:
         except StopIteration:
             return None
 
+    @traced("FileManager.get_file_from_output")
     def get_file_from_output(self):
-        dirpath = Path(cfg["output_dir"]).expanduser()
-        fpaths = [x for x in dirpath.glob(self.filepattern)]
+        dirpath = Path(get_config()["output_dir"]).expanduser()
+        entry = (
+            get_index(dirpath).latest(self.filepattern) if dirpath.is_dir() else None
+        )
+        if entry is None:
+            raise StatementNotFoundError(f"no files in output {dirpath}")
+        return entry.path
+
+    @traced("FileManager.get_files")
+    def get_files(self, include_output: bool = True) -> list[Path]:
+        """Returns every matching file from downloads, codebase and output"""
+        dirpaths = [Path("~/Downloads").expanduser(), Path(__file__).parent.parent]
+        if include_output:
+            dirpaths.append(Path(get_config()["output_dir"]).expanduser())
+        fpaths = {}
+        for dirpath in dirpaths:
+            if not dirpath.is_dir():
+                continue
+            for entry in get_index(dirpath).find(self.filepattern):
+                # the same export may sit in downloads and in output
+                fpaths.setdefault(entry.name, entry.path)
         if not fpaths:
-            raise FileNotFoundError(f"no files in output {dirpath}")
-        fpaths = sorted(fpaths, key=lambda t: os.path.getmtime(t))
-        return fpaths[-1]
+            raise StatementNotFoundError(f"no files found; {self.filepattern=}")
+        return sorted(fpaths.values(), key=lambda t: t.name)
 
 
 class UobExcelReader:
-    """Reads excel files from UOB credit card transactions"""
+    """Reads excel files from UOB credit card transactions
+
+    Construction is cheap; the statement is located and parsed the first time
+    `df` is accessed, and the result is kept until `invalidate` is called.
+    """
 
     def __init__(
         self,
         dt_format: str = "%d %b %Y",
         filepattern: str = "CC_TXN_History_*.xls",
+        fpath: Optional[Path] = None,
+        export: bool = False,
+        cleanup: bool = True,
     ):
-        self.export_to_csv = cfg.get("export_to_csv", False)
+        self.export_to_csv = get_config().get("export_to_csv", False)
         self.dt_format = dt_format
         self.filepattern = filepattern
-        try:
-            self.df = self.parse()
-        except Exception:
-            self.df = pd.DataFrame()
+        self.fpath = fpath
+        self.export = export
+        self.cleanup = cleanup
+        self._df: Optional[pd.DataFrame] = None
+
+    @property
+    def matcher(self) -> CategoryMatcher:
+        return get_config().matcher
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            self.parse(fpath=self.fpath, export=self.export, cleanup=self.cleanup)
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame) -> None:
+        self._df = df
+
+    @property
+    def is_parsed(self) -> bool:
+        return self._df is not None
+
+    def invalidate(self) -> None:
+        """Drops the parsed frame so the next access to df parses again"""
+        self._df = None
 
     def parse(
         self,
@@ -99,57 +171,127 @@ class UobExcelReader:
             filepattern = self.filepattern
         if fpath is None:
             fpath = FileManager(filepattern=filepattern).get_file()
-        if fpath is None:
-            raise FileNotFoundError(f"no files found; {filepattern=}")
+        if not fpath.is_file():
+            raise StatementNotFoundError(f"statement not found; {fpath=}")
         self.fpath = fpath
-        df = self.parse_data(fpath)
-        self.df = df
-        if export:
-            outpath = Path(cfg["folders"]["outf01"]) / f"{get_time()}.csv"
-            df.to_csv(outpath)
-            write_output_log_filepath(lg, outpath)
+        with span("UobExcelReader.parse", file=fpath.name) as sp:
+            content_hash = hash_file(fpath)
+            try:
+                df = self.parse_data_cached(fpath, content_hash=content_hash)
+            except Exception as e:
+                raise StatementParseError(f"failed to parse {fpath.name}; {e}") from e
+            sp.rows = len(df)
+        cfg = get_config()
+        if cfg.get("transaction_store", True):
+            with span("TransactionStore.append", rows=len(df)):
+                store = TransactionStore.from_config(cfg)
+                store.append(df, source_hash=content_hash, source_name=fpath.name)
+        df = compact_from_config(df, cfg)
+        self._df = df
+        if export or self.export_to_csv:
+            fmt = "csv" if self.export_to_csv else cfg.get("export_format", "parquet")
+            with span("export_frame", rows=len(df)):
+                export_frame(df, cfg, fmt=fmt, source_name=fpath.name)
         if cleanup:
-            self.perform_clean_up()
+            self.perform_clean_up(content_hash)
+            # the statement now lives in output_dir; re-parses read it there
+            self.cleanup = False
         return df
 
-    def parse_data(self, filepath):
+    def parse_data_cached(
+        self,
+        filepath,
+        payload: Optional[bytes] = None,
+        content_hash: str = "",
+    ):
+        """Loads the parsed frame from the parse cache, parsing only on a miss"""
+        cfg = get_config()
+        cache = ParseCache.from_config(cfg)
+        if cache is None:
+            source = None if payload is None else io.BytesIO(payload)
+            return self.parse_data(filepath, source=source)
+        if not content_hash and payload is None:
+            content_hash = hash_file(filepath)
+        elif not content_hash:
+            content_hash = hash_bytes(payload)
+        key = cache.make_key(content_hash, cfg, self.dt_format, PARSED_SCHEMA_VERSION)
+        with span("ParseCache.get") as sp:
+            df = cache.get(key)
+            sp.attrs["hit"] = df is not None
+        if df is not None:
+            lg.info(f"loaded {filepath.name} from parse cache")
+            return df
+        source = None if payload is None else io.BytesIO(payload)
+        df = self.parse_data(filepath, source=source)
+        cache.put(key, df)
+        return df
+
+    def parse_data(self, filepath, source=None):
+        """Parses a statement; source may be the prefetched file contents"""
         lg.info(f"reading {filepath.name} ...")
-        df = pd.read_excel(filepath, skiprows=list(np.arange(0, 9)), header=0)
-        df = self.drop_na_with_threshold(df)
+        if source is None:
+            source = filepath
+        with span("parse_data", file=filepath.name) as sp:
+            with span("read_data") as sp_read:
+                df = self.read_data(source)
+                sp_read.rows = len(df)
+            with span("add_minor_units", rows=len(df)):
+                df = add_minor_units(df)
+            with span("categorize", rows=len(df)):
+                df = self.categorize(df)
+            with span("to_datetime", rows=len(df)):
+                df["date_transacted"] = pd.to_datetime(
+                    df["date_transacted"], format=self.dt_format
+                )
+            sp.rows = len(df)
+        return df.sort_index()
+
+    def read_data(self, source) -> pd.DataFrame:
+        cfg = get_config()
         col_headers = cfg["parser_settings"]["columns_mapper"]
+        df = read_statement(
+            source,
+            header_names=col_headers.keys(),
+            drop_na_threshold=cfg["parser_settings"]["drop_na_threshold"],
+        )
         if col_headers:
             df = df.rename(col_headers, axis=1)
+        return df
 
-        df["item"] = df["description"].apply(lambda x: x.split("  ")[0])
-
-        dflist = []
-        for k, v in cfg["category_mapper"].items():
-            df_ = df[df["item"].str.contains(k)].copy()
-            df_["key_code"] = v
-            dflist.append(df_)
+    def get_memo(self) -> CategoryMemo:
+        return CategoryMemo.from_config(get_config())
 
-        df = pd.concat([df] + dflist)
-        df.drop_duplicates(subset=["description"], keep="last", inplace=True)
-        df["key_code"] = df["key_code"].fillna(1)
+    def categorize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Sets item, key_code and qualified, memoized by description"""
+        memo = self.get_memo()
+        resolved = memo.resolve(df["description"], self.categorize_descriptions)
+        memo.save()
+        df["item"] = resolved["item"]
         df["key_code"] = pd.to_numeric(
-            df["key_code"], downcast="integer", errors="raise"
-        )
-        df["date_transacted"] = pd.to_datetime(
-            df["date_transacted"], format=self.dt_format
+            resolved["key_code"], downcast="integer", errors="raise"
         )
+        df["qualified"] = resolved["qualified"]
+        return df
 
-        qual_dict = {}
-        for k, v in cfg["qualifications_table"].items():
-            qual_dict[int(k)] = v
-
-        df["qualified"] = df["key_code"].apply(lambda x: qual_dict[x])
+    def categorize_descriptions(self, descriptions) -> pd.DataFrame:
+        """Categorizes descriptions through the matcher, without the memo"""
+        df = pd.DataFrame({"item": [d.split("  ")[0] for d in descriptions]})
+        df["key_code"] = self.matcher.assign(df["item"])
+        return self.map_qualified(df)
 
-        return df.sort_index()
+    @staticmethod
+    def map_qualified(df: pd.DataFrame) -> pd.DataFrame:
+        cfg = get_config()
+        codes = df["key_code"].to_numpy()
+        unknown = set(np.unique(codes)) - set(cfg.qualifications)
+        if unknown:
+            raise KeyError(f"key codes missing from qualifications_table; {unknown=}")
+        df["qualified"] = cfg.qualified_lookup[codes]
+        return df
 
     def drop_na_with_threshold(self, dfin):
-        df = dfin[
-            (dfin.isnull().sum(axis=1)) < cfg["parser_settings"]["drop_na_threshold"]
-        ]
+        thresh = get_config()["parser_settings"]["drop_na_threshold"]
+        df = dfin[(dfin.isnull().sum(axis=1)) < thresh]
         return df
 
         df = dfin.copy()
@@ -157,28 +299,51 @@ class UobExcelReader:
         df = df[(df.isnull().sum(axis=1)) < thresh]
         return df
 
-    def perform_clean_up(self):
+    def perform_clean_up(self, content_hash: str = ""):
         if not self.fpath.is_file():
             lg.warning("nothing to cleanup")
-        dirpath = Path(cfg["output_dir"]).expanduser()
-        outpath = dirpath / self.fpath.name
-        if not dirpath.is_dir():
-            dirpath.mkdir(exist_ok=True, parents=True)
-            lg.warning(f"created {dirpath=}")
-
-        shutil.copy(self.fpath, outpath)
-        lg.debug(f"created copy in {outpath}")
-        os.remove(self.fpath)
-        lg.debug(f"created copy in {outpath}")
+            return
+        archive = StatementArchive.from_config(get_config())
+        outpath = archive.add(self.fpath, content_hash=content_hash)
         lg.info(f"clean up completed - {self.fpath}")
+        self.fpath = outpath
+
+
+class UobPdfReader(UobExcelReader):
+    """Reads UOB credit card PDF statements into the same frame as the excel
+
+    Pages are extracted in page ranges across a process pool; see
+    pdfreader.read_pdf_statement.
+    """
+
+    def __init__(
+        self,
+        dt_format: str = "%d %b %Y",
+        filepattern: str = "eStatement*.pdf",
+        fpath: Optional[Path] = None,
+        export: bool = False,
+        cleanup: bool = True,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 4,
+    ):
+        super().__init__(dt_format, filepattern, fpath, export, cleanup)
+        self.max_workers = max_workers
+        self.pages_per_task = pages_per_task
+
+    def read_data(self, source) -> pd.DataFrame:
+        return read_pdf_statement(
+            source, max_workers=self.max_workers, pages_per_task=self.pages_per_task
+        )
 
 
 def test_uob_excel_reader():
+    create_app()
     pd.set_option("display.max_rows", 20)
     pd.set_option("display.max_columns", 15)
     pd.set_option("display.width", 1000)
 
     uob = UobExcelReader()
+    print(uob.df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# amounts are held as integer hundredths of the currency unit
+MINOR_UNITS = 100
+
+
+def to_amounts(values: pd.Series) -> pd.Series:
+    """Converts text amounts such as "1,234.50" to float64; NaN when missing"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    text = values.astype("string").str.replace(",", "", regex=False)
+    amounts = pd.to_numeric(text.str.strip(), errors="raise")
+    return pd.Series(
+        amounts.to_numpy(dtype="float64", na_value=np.nan),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def to_minor_units(values: pd.Series, nullable: bool = False) -> pd.Series:
+    """Converts amounts to int64 minor units
+
+    Statement amounts carry at most two decimals, so rounding the scaled float
+    to the nearest integer recovers the exact value. Text amounts are cleaned
+    up first with to_amounts. Missing amounts need nullable=True and
+    come back as <NA> in an Int64 column.
+    """
+    values = to_amounts(values)
+    scaled = np.rint(values.to_numpy(dtype="float64") * MINOR_UNITS)
+    if nullable:
+        return pd.Series(scaled, index=values.index).astype("Int64")
+    if np.isnan(scaled).any():
+        raise ValueError(f"missing amounts in {values.name}")
+    return pd.Series(scaled.astype("int64"), index=values.index, name=values.name)
+
+
+def add_minor_units(df: pd.DataFrame) -> pd.DataFrame:
+    df["amount_cents"] = to_minor_units(df["amount"])
+    if "amount_foreign" in df.columns:
+        df["amount_foreign_cents"] = to_minor_units(df["amount_foreign"], nullable=True)
+    return df
+
+
+def get_minor_units(df: pd.DataFrame) -> np.ndarray:
+    """amount_cents of df, derived from amount for frames stored without it"""
+    if "amount_cents" in df.columns:
+        return df["amount_cents"].to_numpy(dtype="int64")
+    return to_minor_units(df["amount"]).to_numpy()
+
+
+def format_minor(value: int) -> str:
+    """Formats minor units as a decimal string, e.g. -1234 -> "-12.34" """
+    value = int(value)
+    sign = "-" if value < 0 else ""
+    units, cents = divmod(abs(value), MINOR_UNITS)
+    return f"{sign}{units}.{cents:02d}"
@@ -0,0 +1,272 @@
+import calendar
+import io
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from .utils import LoggerManager
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# every transaction page of a UOB card statement carries this table header;
+# pages without any of the probes are skipped before line parsing
+PAGE_PROBES = ("Transaction Amount", "Post Date", "Trans Date")
+# probes of the raw content stream, which also keeps pages with the date
+RAW_PROBES = tuple(
+    re.sub(r"\s+", "", probe).encode("latin-1")
+    for probe in (*PAGE_PROBES, "Statement Date")
+)
+TXN_LINE = re.compile(
+    r"^(?P<date_posted>\d{2} [A-Z]{3})\s+(?P<date_transacted>\d{2} [A-Z]{3})\s+"
+    r"(?P<description>.+?)\s+(?P<amount>[\d,]+\.\d{2})(?P<credit>\s*CR)?$"
+)
+FOREIGN_LINE = re.compile(r"^(?P<currency>[A-Z]{3})\s+(?P<amount>[\d,]+\.\d{2})$")
+STATEMENT_DATE = re.compile(r"Statement Date\s*:?\s*(\d{1,2} [A-Z]{3} \d{4})", re.I)
+# literal strings and hex strings in a content stream
+LITERAL_STRING = re.compile(rb"\((?:[^()\\]|\\.)*\)")
+HEX_STRING = re.compile(rb"(?<!<)<[0-9A-Fa-f\s]*>(?!>)")
+# fonts whose literal strings are the text itself, unless re-encoded
+SIMPLE_FONTS = {"/Type1", "/TrueType", "/MMType1"}
+MONTHS = {m.upper(): i for i, m in enumerate(calendar.month_abbr) if m}
+PDF_COLUMNS = [
+    "date_transacted",
+    "date_posted",
+    "description",
+    "currency_foreign",
+    "amount_foreign",
+    "currency",
+    "amount",
+]
+
+
+@dataclass
+class PageResult:
+    page: int
+    statement_date: Optional[str] = None
+    rows: list[dict] = field(default_factory=list)
+    skipped: bool = False
+
+
+# reader of the document a pool worker parses, opened once per worker
+_worker_reader = None
+
+
+def open_pdf(source):
+    """PdfReader over a path or a binary file object
+
+    pypdf copies a whole file into memory when given its path, so paths are
+    opened as files instead. From a file object it reads the trailer and the
+    xref table on opening, and the objects of each page as it is used. The
+    file stays open for as long as the reader.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("parsing PDF statements requires `pip install pypdf`") from e
+    if isinstance(source, (str, Path)):
+        source = open(source, "rb")
+    return PdfReader(source)
+
+
+def init_worker(fpath: str, initializer=None, initargs=()) -> None:
+    global _worker_reader
+    if initializer is not None:
+        initializer(*initargs)
+    _worker_reader = open_pdf(fpath)
+
+
+def extract_worker_pages(pages: list[int]) -> list[PageResult]:
+    return extract_pages(_worker_reader, pages)
+
+
+def has_text(page) -> bool:
+    """Cheap probe on the raw content stream; scanned or blank pages have no text"""
+    contents = page.get_contents()
+    if contents is None:
+        return False
+    data = contents.get_data()
+    return b"Tj" in data or b"TJ" in data
+
+
+def is_plain_text(page) -> bool:
+    """Whether the page's text can be read straight from its content stream
+
+    True when every font is a simple font with a standard encoding and the
+    page draws no form xobjects, which may hold text of their own.
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    for xobject in resources.get("/XObject", {}).values():
+        if xobject.get_object().get("/Subtype") == "/Form":
+            return False
+    for font in resources.get("/Font", {}).values():
+        font = font.get_object()
+        if font.get("/Subtype") not in SIMPLE_FONTS:
+            return False
+        if not isinstance(font.get("/Encoding", "/StandardEncoding"), str):
+            return False
+    return True
+
+
+def probe_content(page) -> Optional[bool]:
+    """Looks for the table header or the statement date in the raw content
+
+    Strings are joined with whitespace dropped, since a TJ array may split
+    words to kern them. Returns None when the page's text is encoded, e.g.
+    by Type0 fonts, and only a full extraction can tell.
+    """
+    if not is_plain_text(page):
+        return None
+    data = page.get_contents().get_data()
+    if HEX_STRING.search(data):
+        return None
+    text = b"".join(m[1:-1] for m in LITERAL_STRING.findall(data))
+    text = re.sub(rb"\s+", b"", text)
+    return any(probe in text for probe in RAW_PROBES)
+
+
+def parse_page_text(text: str) -> list[dict]:
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if match := TXN_LINE.match(line):
+            amount = float(match["amount"].replace(",", ""))
+            rows.append(
+                {
+                    "date_posted": match["date_posted"],
+                    "date_transacted": match["date_transacted"],
+                    "description": match["description"],
+                    "currency_foreign": None,
+                    "amount_foreign": float("nan"),
+                    "currency": "SGD",
+                    "amount": -amount if match["credit"] else amount,
+                }
+            )
+        elif rows and (match := FOREIGN_LINE.match(line)):
+            # the foreign amount is printed under the transaction it belongs to
+            rows[-1]["currency_foreign"] = match["currency"]
+            rows[-1]["amount_foreign"] = float(match["amount"].replace(",", ""))
+    return rows
+
+
+def extract_pages(reader, pages: list[int]) -> list[PageResult]:
+    """Extracts transactions from the given pages of an open reader"""
+    results = []
+    for number in pages:
+        page = reader.pages[number]
+        result = PageResult(page=number)
+        # full extraction is the expensive part, so it only runs on pages
+        # which may hold the table or the statement date
+        if not has_text(page) or probe_content(page) is False:
+            result.skipped = True
+            results.append(result)
+            continue
+        text = page.extract_text() or ""
+        if match := STATEMENT_DATE.search(text):
+            result.statement_date = match[1]
+        if any(probe in text for probe in PAGE_PROBES):
+            result.rows = parse_page_text(text)
+        else:
+            result.skipped = True
+        results.append(result)
+    return results
+
+
+def iter_page_results(
+    fpath: Path, max_workers: Optional[int] = None, pages_per_task: int = 4
+) -> Iterator[PageResult]:
+    """Yields page results in page order while later pages are still parsing
+
+    Small documents are parsed in-process since a pool would cost more than
+    it saves; larger ones are split into page ranges across a process pool
+    with a bounded number of ranges in flight.
+    """
+    with open(fpath, "rb") as f:
+        reader = open_pdf(f)
+        n_pages = len(reader.pages)
+        chunks = deque(
+            list(range(start, min(start + pages_per_task, n_pages)))
+            for start in range(0, n_pages, pages_per_task)
+        )
+        max_workers = max_workers or os.cpu_count() or 1
+        if len(chunks) <= 1 or max_workers == 1:
+            for chunk in chunks:
+                yield from extract_pages(reader, chunk)
+            return
+
+    window = max_workers * 2
+    pending = {}
+    done_chunks = {}
+    next_index = 0
+    submitted = 0
+    log_initializer, log_initargs = LoggerManager.get_worker_logging()
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=init_worker,
+        initargs=(str(fpath), log_initializer, log_initargs),
+    ) as pool:
+        while chunks or pending:
+            while chunks and len(pending) < window:
+                future = pool.submit(extract_worker_pages, chunks.popleft())
+                pending[future] = submitted
+                submitted += 1
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                done_chunks[pending.pop(future)] = future.result()
+            while next_index in done_chunks:
+                yield from done_chunks.pop(next_index)
+                next_index += 1
+
+
+def resolve_dates(dates: pd.Series, statement_date: pd.Timestamp) -> pd.Series:
+    """Adds the year to "DD MON" dates; months after the statement month are
+    from the year before, e.g. December purchases on a January statement"""
+    months = dates.str[-3:].map(MONTHS)
+    years = statement_date.year - (months > statement_date.month).astype(int)
+    return dates.str.title() + " " + years.astype(str)
+
+
+def read_pdf_statement(
+    source, max_workers: Optional[int] = None, pages_per_task: int = 4
+) -> pd.DataFrame:
+    """Reads the transaction table of a UOB card statement PDF
+
+    Returns the same columns as the renamed excel export, with dates as
+    "DD Mon YYYY" text; credits are negative amounts.
+    """
+    if isinstance(source, (bytes, io.BytesIO)):
+        # in-memory payloads cannot be shared with the pool; parse in-process
+        source = io.BytesIO(source) if isinstance(source, bytes) else source
+        reader = open_pdf(source)
+        results = extract_pages(reader, list(range(len(reader.pages))))
+    else:
+        results = iter_page_results(Path(source), max_workers, pages_per_task)
+
+    rows = []
+    statement_date = None
+    skipped = 0
+    for result in results:
+        statement_date = statement_date or result.statement_date
+        skipped += result.skipped
+        rows.extend(result.rows)
+    lg.debug(f"pdf statement rows={len(rows)} skipped_pages={skipped}")
+
+    df = pd.DataFrame.from_records(rows, columns=PDF_COLUMNS)
+    if df.empty:
+        return df
+    if statement_date is None:
+        raise ValueError("statement date not found in PDF statement")
+    statement_date = pd.Timestamp(statement_date)
+    for col in ["date_transacted", "date_posted"]:
+        df[col] = resolve_dates(df[col], statement_date)
+    return df
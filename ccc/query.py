@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .money import MINOR_UNITS, get_minor_units
+
+
+@dataclass
+class SortedColumn:
+    """Column values with the row order that sorts them"""
+
+    values: np.ndarray
+    order: np.ndarray
+    sorted_values: np.ndarray
+
+    @classmethod
+    def build(cls, values: np.ndarray) -> "SortedColumn":
+        order = np.argsort(values, kind="stable")
+        return cls(values, order, values[order])
+
+    def bounds(self, low=None, high=None) -> tuple[int, int]:
+        """Slice of `order` holding the rows with low <= value <= high"""
+        start = 0 if low is None else self.sorted_values.searchsorted(low, "left")
+        end = (
+            len(self.values)
+            if high is None
+            else self.sorted_values.searchsorted(high, "right")
+        )
+        return int(start), int(max(start, end))
+
+
+@dataclass
+class Criterion:
+    """One query criterion: the order slices it covers and a row filter"""
+
+    slices: list[tuple[np.ndarray, int, int]]
+    accept: Callable[[np.ndarray], np.ndarray]
+
+    @property
+    def size(self) -> int:
+        return sum(end - start for _, start, end in self.slices)
+
+    def rows(self) -> np.ndarray:
+        parts = [order[start:end] for order, start, end in self.slices]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, np.intp)
+
+
+class TransactionIndex:
+    """Indexed read-only queries over a parsed transaction frame
+
+    Dates and amounts are kept as sorted arrays alongside the row order, so a
+    range is found with two bisections. Items and key codes are factorized
+    into sorted codes, which gives an inverted index from each value to its
+    rows. Merchant names sharing a prefix get adjacent codes, so a prefix
+    maps to one contiguous block of that index.
+
+    `query` counts the rows each criterion covers, which needs no scan. It
+    materializes only the most selective criterion and checks the others
+    against those rows alone. Results are sorted row positions; `select`
+    turns them into rows. Indexes are built on first use, and the frame must
+    not be modified while the index is in use.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+        self.n_rows = len(df)
+
+    @cached_property
+    def dates(self) -> SortedColumn:
+        return SortedColumn.build(
+            self.df["date_transacted"].to_numpy(dtype="datetime64[ns]")
+        )
+
+    @cached_property
+    def amounts(self) -> SortedColumn:
+        return SortedColumn.build(get_minor_units(self.df))
+
+    @staticmethod
+    def factorize(values: pd.Series) -> tuple[SortedColumn, np.ndarray]:
+        codes, uniques = pd.factorize(values, sort=True)
+        return SortedColumn.build(codes), np.asarray(uniques)
+
+    @cached_property
+    def items(self) -> tuple[SortedColumn, np.ndarray]:
+        return self.factorize(self.df["item"].astype(str))
+
+    @cached_property
+    def key_codes(self) -> tuple[SortedColumn, np.ndarray]:
+        return self.factorize(self.df["key_code"].astype(int))
+
+    def date_criterion(self, start=None, end=None) -> Criterion:
+        col = self.dates
+        low = None if start is None else np.datetime64(pd.Timestamp(start), "ns")
+        high = None if end is None else np.datetime64(pd.Timestamp(end), "ns")
+        lo, hi = col.bounds(low, high)
+
+        def accept(rows):
+            values = col.values[rows]
+            ok = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                ok &= values >= low
+            if high is not None:
+                ok &= values <= high
+            return ok
+
+        return Criterion([(col.order, lo, hi)], accept)
+
+    def amount_criterion(self, low=None, high=None) -> Criterion:
+        col = self.amounts
+        low = None if low is None else round(low * MINOR_UNITS)
+        high = None if high is None else round(high * MINOR_UNITS)
+        lo, hi = col.bounds(low, high)
+
+        def accept(rows):
+            values = col.values[rows]
+            ok = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                ok &= values >= low
+            if high is not None:
+                ok &= values <= high
+            return ok
+
+        return Criterion([(col.order, lo, hi)], accept)
+
+    def prefix_criterion(self, prefix: str) -> Criterion:
+        col, uniques = self.items
+        first = int(uniques.searchsorted(prefix, "left"))
+        last = int(uniques.searchsorted(prefix + "\U0010ffff", "left"))
+        lo, hi = col.bounds(first, last - 1) if last > first else (0, 0)
+        return Criterion(
+            [(col.order, lo, hi)],
+            lambda rows: (col.values[rows] >= first) & (col.values[rows] < last),
+        )
+
+    def category_criterion(self, key_codes: Iterable[int]) -> Criterion:
+        col, uniques = self.key_codes
+        key_codes = set(key_codes)
+        wanted = [i for i, k in enumerate(uniques) if k in key_codes]
+        slices = [(col.order, *col.bounds(c, c)) for c in wanted]
+        return Criterion(slices, lambda rows: np.isin(col.values[rows], wanted))
+
+    def query(
+        self,
+        start=None,
+        end=None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        prefix: Optional[str] = None,
+        key_codes: Optional[Iterable[int]] = None,
+    ) -> np.ndarray:
+        """Sorted row positions matching every criterion given"""
+        criteria = []
+        if start is not None or end is not None:
+            criteria.append(self.date_criterion(start, end))
+        if min_amount is not None or max_amount is not None:
+            criteria.append(self.amount_criterion(min_amount, max_amount))
+        if prefix is not None:
+            criteria.append(self.prefix_criterion(prefix))
+        if key_codes is not None:
+            criteria.append(self.category_criterion(list(key_codes)))
+        if not criteria:
+            return np.arange(self.n_rows)
+
+        criteria.sort(key=lambda c: c.size)
+        rows = criteria[0].rows()
+        for criterion in criteria[1:]:
+            if not len(rows):
+                break
+            rows = rows[criterion.accept(rows)]
+        return rows
+
+    def date_range(self, start=None, end=None) -> np.ndarray:
+        return self.query(start=start, end=end)
+
+    def amount_range(self, low=None, high=None) -> np.ndarray:
+        return self.query(min_amount=low, max_amount=high)
+
+    def item_prefix(self, prefix: str) -> np.ndarray:
+        return self.query(prefix=prefix)
+
+    def category(self, *key_codes: int) -> np.ndarray:
+        return self.query(key_codes=key_codes)
+
+    @staticmethod
+    def intersect(*parts: np.ndarray) -> np.ndarray:
+        """Rows present in every sorted part, bisecting the larger parts"""
+        parts = sorted(parts, key=len)
+        rows = parts[0]
+        for part in parts[1:]:
+            if not len(rows) or not len(part):
+                return np.empty(0, dtype=np.intp)
+            found = part.searchsorted(rows)
+            found[found == len(part)] = 0
+            rows = rows[part[found] == rows]
+        return rows
+
+    def select(self, rows: np.ndarray, columns: Optional[list[str]] = None):
+        if columns is None:
+            return self.df.iloc[rows]
+        return self.df.iloc[rows, [self.df.columns.get_loc(c) for c in columns]]
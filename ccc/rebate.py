@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .money import MINOR_UNITS, get_minor_units
+from .store import make_row_keys
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# UOB One Card quarterly cashback; minimum monthly spend and cashback, in S$
+DEFAULT_TIERS = [[500, 50], [1000, 100], [2000, 200]]
+MONTHS_PER_QUARTER = 3
+# a quarter that is over plus one that may still be re-exported
+DEFAULT_RETAIN_MONTHS = 6
+
+
+@dataclass(frozen=True)
+class RebateTier:
+    tier: int
+    min_spend: int
+    reward: int
+
+
+@dataclass
+class MonthAggregate:
+    """Qualified spend of one month, in minor units, and the rows counted
+
+    A closed month keeps its totals but not its row keys, and takes no more
+    rows.
+    """
+
+    spend: int = 0
+    count: int = 0
+    row_keys: set[int] = field(default_factory=set, repr=False)
+    closed: bool = False
+
+
+class RebateLedger:
+    """Running per-month aggregates of qualified spend for the UOB One rebate
+
+    A quarter earns the cashback of the lowest tier met across its three
+    months, where a month meets a tier with at least `min_spend` of qualified
+    spend over at least `min_transactions` purchases. Each update only looks
+    at the rows passed in; rows already counted are recognised by their row
+    key, so overlapping statements can be fed in again safely. Calendar months
+    stand in for statement months.
+
+    Months more than `retain_months` before the latest month in the ledger
+    are closed: their row keys are dropped, so the state file stays bounded,
+    and rows for them are ignored.
+    """
+
+    state_name: str = "rebate.json"
+
+    def __init__(
+        self,
+        dirpath: Path,
+        tiers: Iterable[Iterable[float]] = DEFAULT_TIERS,
+        min_transactions: int = 5,
+        quarter_start_month: int = 1,
+        exclusions: Iterable[str] = (),
+        retain_months: int = DEFAULT_RETAIN_MONTHS,
+    ) -> None:
+        self.dirpath = Path(dirpath).expanduser()
+        self.state_path = self.dirpath / self.state_name
+        self.tiers = [
+            RebateTier(i, round(spend * MINOR_UNITS), round(reward * MINOR_UNITS))
+            for i, (spend, reward) in enumerate(sorted(tiers), start=1)
+        ]
+        self.min_transactions = min_transactions
+        self.quarter_start_month = quarter_start_month
+        self.exclusions = list(exclusions)
+        self.retain_months = retain_months
+        self.months: dict[str, MonthAggregate] = self.load()
+
+    @classmethod
+    def from_config(cls, cfg) -> "RebateLedger":
+        settings = cfg.get("rebate", {})
+        return cls(
+            Path(cfg["output_dir"]).expanduser(),
+            tiers=settings.get("tiers", DEFAULT_TIERS),
+            min_transactions=settings.get("min_transactions", 5),
+            quarter_start_month=settings.get("quarter_start_month", 1),
+            exclusions=cfg.exclusions,
+            retain_months=settings.get("retain_months", DEFAULT_RETAIN_MONTHS),
+        )
+
+    def load(self) -> dict[str, MonthAggregate]:
+        if not self.state_path.is_file():
+            return {}
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        return {
+            month: MonthAggregate(
+                m["spend"], m["count"], set(m["row_keys"]), m.get("closed", False)
+            )
+            for month, m in state["months"].items()
+        }
+
+    def save(self) -> None:
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        state = {
+            "months": {
+                month: {
+                    "spend": agg.spend,
+                    "count": agg.count,
+                    "row_keys": sorted(agg.row_keys),
+                    "closed": agg.closed,
+                }
+                for month, agg in sorted(self.months.items())
+            }
+        }
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def update(self, df: pd.DataFrame) -> int:
+        """Adds the qualified rows of df not counted yet; returns rows added"""
+        qualified = df["qualified"].to_numpy(dtype=bool)
+        if self.exclusions:
+            qualified = qualified & ~df["item"].isin(self.exclusions).to_numpy()
+        if not qualified.any():
+            return 0
+        df = df[qualified]
+        keys = make_row_keys(df).to_numpy()
+        cents = get_minor_units(df)
+        months = df["date_transacted"].dt.strftime("%Y-%m").to_numpy()
+
+        added = 0
+        for month in np.unique(months):
+            agg = self.months.setdefault(month, MonthAggregate())
+            if agg.closed:
+                continue
+            for key, amount in zip(keys[months == month], cents[months == month]):
+                key = int(key)
+                if key in agg.row_keys:
+                    continue
+                agg.row_keys.add(key)
+                agg.spend += int(amount)
+                agg.count += int(amount > 0)
+                added += 1
+        lg.debug(f"rebate ledger added {added} of {len(df)} qualified rows")
+        self.close_months()
+        return added
+
+    def close_months(self) -> int:
+        """Closes the months outside the retention window; returns how many"""
+        if not self.months:
+            return 0
+        latest = pd.Period(max(self.months), freq="M")
+        cutoff = str(latest - self.retain_months)
+        closed = 0
+        for month, agg in self.months.items():
+            if month <= cutoff and not agg.closed:
+                agg.row_keys.clear()
+                agg.closed = True
+                closed += 1
+        if closed:
+            lg.debug(f"rebate ledger closed {closed} months up to {cutoff}")
+        return closed
+
+    def get_month_tier(self, month: str) -> int:
+        agg = self.months.get(month)
+        if agg is None or agg.count < self.min_transactions:
+            return 0
+        met = [t.tier for t in self.tiers if agg.spend >= t.min_spend]
+        return max(met, default=0)
+
+    def get_reward(self, tier: int) -> int:
+        return next((t.reward for t in self.tiers if t.tier == tier), 0)
+
+    def get_quarter_start(self, month: pd.Period) -> pd.Period:
+        offset = (month.month - self.quarter_start_month) % MONTHS_PER_QUARTER
+        return month - offset
+
+    def report(self, today: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Projected versus earned cashback per quarter, in minor units
+
+        A quarter is earned once all of its months have passed. Until then
+        the projection assumes the months still to come repeat the lowest
+        tier met so far.
+        """
+        current = pd.Timestamp(today or pd.Timestamp.now()).to_period("M")
+        quarters = sorted(
+            {self.get_quarter_start(pd.Period(m, freq="M")) for m in self.months}
+        )
+        records = []
+        for start in quarters:
+            months = [start + i for i in range(MONTHS_PER_QUARTER)]
+            seen = [m for m in months if str(m) in self.months and m <= current]
+            tiers = [self.get_month_tier(str(m)) for m in seen]
+            tier = min(tiers, default=0)
+            complete = months[-1] < current and len(seen) == MONTHS_PER_QUARTER
+            records.append(
+                {
+                    "quarter": f"{months[0]}..{months[-1]}",
+                    "months_seen": len(seen),
+                    "spend": sum(self.months[str(m)].spend for m in seen),
+                    "month_tiers": "/".join(str(t) for t in tiers),
+                    "tier": tier,
+                    "projected": self.get_reward(tier),
+                    "earned": self.get_reward(tier) if complete else 0,
+                }
+            )
+        return pd.DataFrame.from_records(
+            records,
+            columns=[
+                "quarter",
+                "months_seen",
+                "spend",
+                "month_tiers",
+                "tier",
+                "projected",
+                "earned",
+            ],
+        )
@@ -0,0 +1,197 @@
+import logging
+import os
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from .utils import StatementParseError
+from .xlreader import XLS_MAGIC, XLSX_MAGIC, read_head
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+PDF_MAGIC = b"%PDF-"
+# bytes read from the start of a file, or of an xlsx shared string table,
+# when looking for header signatures
+PROBE_BYTES = 65_536
+
+
+@dataclass(frozen=True)
+class ParserSpec:
+    """A statement format of one bank and the reader that parses it
+
+    A file matches when its container is one of `containers` and at least
+    `min_matches` of the `signatures` appear in its probed text.
+    """
+
+    name: str
+    bank: str
+    containers: tuple[str, ...]
+    signatures: tuple[str, ...]
+    factory: Callable = field(repr=False, compare=False)
+    min_matches: int = 3
+
+
+@dataclass
+class SniffResult:
+    fpath: Path
+    container: str
+    spec: Optional[ParserSpec] = None
+    matches: int = 0
+
+    @property
+    def bank(self) -> str:
+        return self.spec.bank if self.spec else ""
+
+
+_registry: dict[str, ParserSpec] = {}
+
+
+def register(spec: ParserSpec) -> ParserSpec:
+    _registry[spec.name] = spec
+    return spec
+
+
+def get_specs() -> list[ParserSpec]:
+    return list(_registry.values())
+
+
+def sniff_container(head: bytes) -> str:
+    if head.startswith(XLS_MAGIC):
+        return "xls"
+    if head.startswith(XLSX_MAGIC):
+        return "xlsx"
+    if head.startswith(PDF_MAGIC):
+        return "pdf"
+    return "unknown"
+
+
+def probe_xls(fpath: Path, size: int) -> str:
+    """Text of the first bytes of a BIFF workbook
+
+    The shared string table, which holds the header cells, sits in the
+    workbook globals ahead of the sheet data. Strings are stored as latin-1
+    or UTF-16; both decodings are returned so either can be searched.
+    """
+    with open(fpath, "rb") as f:
+        head = f.read(size)
+    return head.decode("latin-1") + "\n" + head.decode("utf-16-le", errors="ignore")
+
+
+def probe_xlsx(fpath: Path, size: int) -> str:
+    """Start of the shared strings, or of the first sheet, of an xlsx
+
+    Only the zip directory and the first bytes of one member are read.
+    """
+    with zipfile.ZipFile(fpath) as zf:
+        names = set(zf.namelist())
+        for member in ["xl/sharedStrings.xml", "xl/worksheets/sheet1.xml"]:
+            if member in names:
+                with zf.open(member) as f:
+                    return f.read(size).decode("utf-8", errors="ignore")
+    return ""
+
+
+def probe_pdf(fpath: Path, size: int) -> str:
+    """Text of the first page
+
+    pypdf reads from the open file on demand, so only the xref table and the
+    objects of the first page are loaded, not the whole document.
+    """
+    from .pdfreader import open_pdf
+
+    with open(fpath, "rb") as f:
+        try:
+            reader = open_pdf(f)
+        except ImportError as e:
+            lg.debug(f"cannot probe {fpath.name}; {e}")
+            return ""
+        return reader.pages[0].extract_text()[:size] if len(reader.pages) else ""
+
+
+PROBES = {"xls": probe_xls, "xlsx": probe_xlsx, "pdf": probe_pdf}
+
+
+def sniff(fpath: Path, size: int = PROBE_BYTES) -> SniffResult:
+    """Identifies the container and the registered format of a file"""
+    fpath = Path(fpath)
+    result = SniffResult(fpath, sniff_container(read_head(fpath, 8)))
+    probe = PROBES.get(result.container)
+    if probe is None:
+        return result
+    try:
+        text = probe(fpath, size)
+    except Exception as e:
+        lg.debug(f"probe failed for {fpath.name}; {e}")
+        return result
+    for spec in get_specs():
+        if result.container not in spec.containers:
+            continue
+        matches = sum(signature in text for signature in spec.signatures)
+        if matches >= spec.min_matches and matches > result.matches:
+            result.spec, result.matches = spec, matches
+    return result
+
+
+def classify(fpaths: Iterable[Path]) -> list[SniffResult]:
+    return [sniff(fpath) for fpath in fpaths]
+
+
+def classify_dir(dirpath: Path) -> list[SniffResult]:
+    """Sniffs every file directly inside dirpath"""
+    with os.scandir(Path(dirpath).expanduser()) as it:
+        fpaths = sorted(Path(e.path) for e in it if e.is_file())
+    return classify(fpaths)
+
+
+def get_reader(fpath: Path, **kwargs):
+    """Reader for fpath chosen by sniffing; kwargs go to the reader"""
+    result = sniff(fpath)
+    if result.spec is None:
+        raise StatementParseError(
+            f"unrecognised statement format; {fpath=} container={result.container}"
+        )
+    lg.debug(f"{Path(fpath).name} sniffed as {result.spec.name}")
+    return result.spec.factory(fpath=Path(fpath), **kwargs)
+
+
+def make_uob_excel_reader(**kwargs):
+    from .models import UobExcelReader
+
+    return UobExcelReader(**kwargs)
+
+
+def make_uob_pdf_reader(**kwargs):
+    from .models import UobPdfReader
+
+    return UobPdfReader(**kwargs)
+
+
+register(
+    ParserSpec(
+        name="uob-card-excel",
+        bank="UOB",
+        containers=("xls", "xlsx"),
+        signatures=(
+            "Transaction Date",
+            "Posting Date",
+            "Description",
+            "Foreign Currency Type",
+            "Transaction Amount(Foreign)",
+            "Local Currency Type",
+            "Transaction Amount(Local)",
+        ),
+        factory=make_uob_excel_reader,
+    )
+)
+register(
+    ParserSpec(
+        name="uob-card-pdf",
+        bank="UOB",
+        containers=("pdf",),
+        signatures=("UOB", "Statement Date", "Post Date", "Trans Date"),
+        factory=make_uob_pdf_reader,
+        min_matches=2,
+    )
+)
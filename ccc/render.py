@@ -0,0 +1,196 @@
+import html
+import logging
+import sys
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, Optional, TextIO
+
+import numpy as np
+import pandas as pd
+
+from .money import format_minor
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+DEFAULT_COLUMNS = ["date_transacted", "item", "amount", "key_code"]
+# money columns are rendered from their exact minor unit counterparts
+MINOR_UNIT_COLUMNS = {
+    "amount": "amount_cents",
+    "amount_foreign": "amount_foreign_cents",
+}
+
+
+def resolve_columns(
+    wanted: Iterable[str], available: Iterable[str], fallback=DEFAULT_COLUMNS
+) -> list[str]:
+    """display_columns that exist in the frame, in config order"""
+    available = list(available)
+    wanted = list(wanted)
+    columns = [c for c in wanted if c in available]
+    missing = [c for c in wanted if c not in available]
+    if missing:
+        lg.debug(f"display_columns not in the frame; ignoring {missing}")
+    if not columns:
+        columns = [c for c in fallback if c in available]
+    return columns
+
+
+def format_value(value) -> str:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def iter_pages(
+    df: pd.DataFrame, rows: np.ndarray, columns: list[str], page_size: int
+) -> Iterator[list[list[str]]]:
+    """Formatted cells of df at the given row positions, one page at a time
+
+    Only one page of rows is selected and formatted at any time, so memory
+    does not grow with the size of the section.
+    """
+    sources = [MINOR_UNIT_COLUMNS.get(c, c) for c in columns]
+    sources = [s if s in df.columns else c for s, c in zip(sources, columns)]
+    positions = [df.columns.get_loc(s) for s in sources]
+    is_minor = [s != c for s, c in zip(sources, columns)]
+    for start in range(0, len(rows), page_size):
+        page = df.iloc[rows[start : start + page_size], positions]
+        yield [
+            [
+                format_minor(v) if minor and not pd.isna(v) else format_value(v)
+                for v, minor in zip(values, is_minor)
+            ]
+            for values in page.itertuples(index=False, name=None)
+        ]
+
+
+class Sink(ABC):
+    """Receives report sections a page at a time and writes them to a stream"""
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def begin_report(self) -> None:
+        pass
+
+    @abstractmethod
+    def begin_section(self, title: str, columns: list[str], n_rows: int) -> None: ...
+
+    @abstractmethod
+    def write_page(self, number: int, cells: list[list[str]]) -> None: ...
+
+    @abstractmethod
+    def end_section(self, total: str) -> None: ...
+
+    def end_report(self) -> None:
+        self.stream.flush()
+
+
+class TextSink(Sink):
+    """Plain text tables for the terminal or a file, sized per page"""
+
+    str_length: int = 84
+
+    def begin_section(self, title: str, columns: list[str], n_rows: int) -> None:
+        self.columns = columns
+        self.n_rows = n_rows
+        spaces1 = (self.str_length - (len(title) + 4)) // 2
+        spaces2 = self.str_length - (len(title) + 4) - spaces1
+        self.stream.write(f"\n{'*'*spaces1}  {title}  {'*'*spaces2}\n")
+        if not n_rows:
+            self.stream.write("(no transactions)\n")
+
+    def write_page(self, number: int, cells: list[list[str]]) -> None:
+        widths = [len(c) for c in self.columns]
+        for row in cells:
+            widths = [max(w, len(v)) for w, v in zip(widths, row)]
+        if number > 0:
+            self.stream.write(f"{'- '*(self.str_length // 2)}\n")
+        header = "  ".join(c.rjust(w) for c, w in zip(self.columns, widths))
+        self.stream.write(f"{header}\n")
+        for row in cells:
+            self.stream.write("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+            self.stream.write("\n")
+
+    def end_section(self, total: str) -> None:
+        self.stream.write(f"{'-'*self.str_length}\n")
+        self.stream.write(f"Rows = {self.n_rows}; Subtotal = ${total}\n")
+        self.stream.write(f"{'*'*self.str_length}\n")
+
+
+class MarkdownSink(Sink):
+    def begin_section(self, title: str, columns: list[str], n_rows: int) -> None:
+        self.stream.write(f"\n## {title}\n\n")
+        self.stream.write("| " + " | ".join(columns) + " |\n")
+        self.stream.write("|" + "---|" * len(columns) + "\n")
+
+    def write_page(self, number: int, cells: list[list[str]]) -> None:
+        for row in cells:
+            row = [v.replace("|", "\\|") for v in row]
+            self.stream.write("| " + " | ".join(row) + " |\n")
+
+    def end_section(self, total: str) -> None:
+        self.stream.write(f"\n**Subtotal = ${total}**\n")
+
+
+class HtmlSink(Sink):
+    def begin_report(self) -> None:
+        self.stream.write("<!DOCTYPE html>\n<html><body>\n")
+
+    def begin_section(self, title: str, columns: list[str], n_rows: int) -> None:
+        self.stream.write(f"<h2>{html.escape(title)}</h2>\n<table>\n<thead><tr>")
+        self.stream.write("".join(f"<th>{html.escape(c)}</th>" for c in columns))
+        self.stream.write("</tr></thead>\n<tbody>\n")
+
+    def write_page(self, number: int, cells: list[list[str]]) -> None:
+        for row in cells:
+            self.stream.write("<tr>")
+            self.stream.write("".join(f"<td>{html.escape(v)}</td>" for v in row))
+            self.stream.write("</tr>\n")
+
+    def end_section(self, total: str) -> None:
+        self.stream.write("</tbody>\n</table>\n")
+        self.stream.write(f"<p>Subtotal = ${html.escape(total)}</p>\n")
+
+    def end_report(self) -> None:
+        self.stream.write("</body></html>\n")
+        super().end_report()
+
+
+SINKS = {"text": TextSink, "markdown": MarkdownSink, "html": HtmlSink}
+
+
+def make_sink(fmt: str = "text", stream: Optional[TextIO] = None) -> Sink:
+    if fmt not in SINKS:
+        raise ValueError(f"unknown {fmt=}; expected one of {list(SINKS)}")
+    return SINKS[fmt](stream or sys.stdout)
+
+
+class ReportRenderer:
+    """Streams report sections into a sink, page by page"""
+
+    def __init__(self, sink: Sink, columns: list[str], page_size: int = 50) -> None:
+        self.sink = sink
+        self.columns = columns
+        self.page_size = page_size
+
+    def render_section(
+        self, title: str, df: pd.DataFrame, rows: np.ndarray, total: int
+    ) -> None:
+        self.sink.begin_section(title, self.columns, len(rows))
+        for number, cells in enumerate(
+            iter_pages(df, rows, self.columns, self.page_size)
+        ):
+            self.sink.write_page(number, cells)
+        self.sink.end_section(format_minor(total))
+
+    def render(self, df: pd.DataFrame, sections) -> None:
+        """Renders (title, rows, total) sections of df"""
+        self.sink.begin_report()
+        for title, rows, total in sections:
+            self.render_section(title, df, rows, total)
+        self.sink.end_report()
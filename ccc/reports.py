@@ -0,0 +1,78 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from .money import get_minor_units
+
+
+@dataclass
+class ReportResult:
+    """Every report section of one frame, as row positions into that frame
+
+    Sections are served by selecting their rows and display columns from the
+    source frame, so nothing beyond the rows shown is ever copied. Totals are
+    exact integer minor units; format them with money.format_minor.
+    """
+
+    df: pd.DataFrame = field(repr=False)
+    subtotals: dict[int, int]
+    category_rows: dict[int, np.ndarray] = field(repr=False)
+    qualified_rows: np.ndarray = field(repr=False)
+    qualified_total: int
+    top_rows: np.ndarray = field(repr=False)
+    top_total: int
+
+    def select(self, rows: np.ndarray, columns: list[str]) -> pd.DataFrame:
+        col_positions = [self.df.columns.get_loc(c) for c in columns]
+        return self.df.iloc[rows, col_positions]
+
+    def get_category_rows(self, category: int) -> tuple[np.ndarray, int]:
+        rows = self.category_rows.get(category, np.empty(0, dtype=np.intp))
+        return rows, self.subtotals.get(category, 0)
+
+    def get_category(self, category: int, columns: list[str]):
+        rows, total = self.get_category_rows(category)
+        return self.select(rows, columns), total
+
+    def get_qualified(self, columns: list[str]):
+        return self.select(self.qualified_rows, columns), self.qualified_total
+
+    def get_top(self, columns: list[str]):
+        return self.select(self.top_rows, columns), self.top_total
+
+
+class ReportEngine:
+    """Computes all report sections of a transaction frame in one pass"""
+
+    def __init__(self, exclusions: Iterable[str] = (), top_n: int = 20) -> None:
+        self.exclusions = list(exclusions)
+        self.top_n = top_n
+
+    def compute(self, df: pd.DataFrame) -> ReportResult:
+        cents = get_minor_units(df)
+
+        grouped = pd.Series(cents).groupby(df["key_code"].to_numpy(), sort=True)
+        subtotals = grouped.sum()
+        category_rows = {int(k): v for k, v in grouped.indices.items()}
+
+        qualified = df["qualified"].to_numpy(dtype=bool)
+        if self.exclusions:
+            qualified = qualified & ~df["item"].isin(self.exclusions).to_numpy()
+        qualified_rows = np.flatnonzero(qualified)
+
+        # partial selection of the largest purchases instead of a full sort
+        positive = np.flatnonzero(cents > 0)
+        top = pd.Series(cents[positive], index=positive).nlargest(self.top_n)
+        top_rows = top.index.to_numpy()
+
+        return ReportResult(
+            df=df,
+            subtotals={int(k): int(v) for k, v in subtotals.items()},
+            category_rows=category_rows,
+            qualified_rows=qualified_rows,
+            qualified_total=int(cents[qualified_rows].sum()),
+            top_rows=top_rows,
+            top_total=int(cents[top_rows].sum()),
+        )
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from .money import to_amounts
+
+# bump when the parsed frame gains or changes columns, so that parse cache
+# entries and exports written by older versions can be told apart
+PARSED_SCHEMA_VERSION = "2"
+
+# low-cardinality text columns which repeat heavily across transactions;
+# description is dictionary-encoded the same way
+CATEGORICAL_COLUMNS = [
+    "item",
+    "description",
+    "currency",
+    "currency_foreign",
+    "date_posted",
+]
+STRING_DTYPES = {"category": "category", "arrow": "string[pyarrow]"}
+# amounts read as text, e.g. "1,234.50" or blank foreign amounts, are stored
+# as float64 like the amounts read as numbers
+AMOUNT_COLUMNS = ["amount", "amount_foreign"]
+
+# memory usage of the frames given to compact_frame inside measure_memory
+_memory_usage: Optional[list[pd.DataFrame]] = None
+
+
+@contextmanager
+def measure_memory() -> Iterator[list[pd.DataFrame]]:
+    """Collects the memory usage of every frame compact_frame is given"""
+    global _memory_usage
+    _memory_usage = []
+    try:
+        yield _memory_usage
+    finally:
+        _memory_usage = None
+
+
+def memory_usage(df: pd.DataFrame) -> pd.DataFrame:
+    """dtype and deep memory usage per column"""
+    return pd.DataFrame(
+        {
+            "dtype": df.dtypes.astype(str),
+            "bytes": df.memory_usage(deep=True, index=False),
+        }
+    )
+
+
+def compact_frame(df: pd.DataFrame, strings: str = "category") -> pd.DataFrame:
+    """Returns df with the compact schema applied
+
+    Text columns become categoricals (or Arrow-backed strings with
+    strings="arrow"), key_code becomes int8, qualified a plain bool and text
+    amounts float64. description is always dictionary-encoded as a
+    categorical.
+    """
+    if strings not in STRING_DTYPES:
+        raise ValueError(f"unknown {strings=}; expected one of {list(STRING_DTYPES)}")
+    if _memory_usage is not None:
+        _memory_usage.append(memory_usage(df))
+    df = df.copy(deep=False)
+    for col in AMOUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = to_amounts(df[col])
+    for col in CATEGORICAL_COLUMNS:
+        if col not in df.columns:
+            continue
+        dtype = "category" if col == "description" else STRING_DTYPES[strings]
+        df[col] = df[col].astype(dtype)
+    if "key_code" in df.columns:
+        df["key_code"] = df["key_code"].astype("int8")
+    if "qualified" in df.columns:
+        df["qualified"] = df["qualified"].astype(bool)
+    return df
+
+
+def compact_from_config(df: pd.DataFrame, cfg) -> pd.DataFrame:
+    """Applies the compact schema when compact_schema is enabled in the config"""
+    if not cfg.get("compact_schema", False):
+        return df
+    return compact_frame(df, strings=cfg.get("compact_strings", "category"))
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Deep memory usage per column before and after compaction
+
+    Both arguments are memory_usage tables.
+    """
+    report = pd.DataFrame(
+        {
+            "dtype_before": before["dtype"],
+            "dtype_after": after["dtype"],
+            "bytes_before": before["bytes"],
+            "bytes_after": after["bytes"],
+        }
+    )
+    report.loc["TOTAL", ["bytes_before", "bytes_after"]] = report[
+        ["bytes_before", "bytes_after"]
+    ].sum()
+    report["saving_pct"] = 100 * (1 - report["bytes_after"] / report["bytes_before"])
+    return report
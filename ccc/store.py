@@ -0,0 +1,296 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .config import get_config
+from .money import add_minor_units
+from .schema import compact_from_config
+from .utils import get_time
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# columns which identify a transaction across overlapping exports
+TXN_KEY_COLUMNS = ["date_transacted", "date_posted", "description", "amount"]
+PARTITION_COLUMN = "month"
+# arrow types of the stored columns, pinned so that a statement whose rows
+# leave a column empty does not write it as a null column; other columns
+# keep the types inferred from the frame
+STORE_TYPES = {
+    "date_transacted": "timestamp[us]",
+    "date_posted": "large_string",
+    "description": "large_string",
+    "currency_foreign": "large_string",
+    "amount_foreign": "double",
+    "currency": "large_string",
+    "amount": "double",
+    "amount_cents": "int64",
+    "amount_foreign_cents": "int64",
+    "item": "large_string",
+    "key_code": "int8",
+    "qualified": "bool",
+    "row_key": "uint64",
+}
+
+
+def make_row_keys(df: pd.DataFrame) -> pd.Series:
+    """Stable 64-bit key per transaction
+
+    Identical transactions within one export are genuine repeats, so they are
+    numbered before hashing and each keeps its own key.
+    """
+    keys = df[TXN_KEY_COLUMNS].copy()
+    keys["_occurrence"] = keys.groupby(TXN_KEY_COLUMNS, dropna=False).cumcount()
+    return pd.util.hash_pandas_object(keys, index=False).astype("uint64")
+
+
+def to_month(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m")
+
+
+def get_store_schema(df: pd.DataFrame):
+    """Schema of df as stored, with the STORE_TYPES columns pinned"""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    fields = [
+        (
+            pa.field(f.name, pa.type_for_alias(STORE_TYPES[f.name]))
+            if f.name in STORE_TYPES
+            else f
+        )
+        for f in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def write_part(df: pd.DataFrame, fpath: Path) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table.cast(get_store_schema(df)), fpath)
+
+
+def empty_frame(columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """Frame with no rows but the stored columns and dtypes"""
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [(name, pa.type_for_alias(alias)) for name, alias in STORE_TYPES.items()]
+    )
+    df = schema.empty_table().to_pandas()
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+
+class TransactionStore:
+    """Append-only parquet store of parsed transactions, partitioned by month
+
+    Each month lives in its own `month=YYYY-MM` directory and every append
+    writes a new part file, so existing partitions are never rewritten.
+    Reads prune partitions by month and push date filters down to parquet.
+    """
+
+    manifest_name: str = "manifest.json"
+
+    def __init__(self, dirpath: Path) -> None:
+        self.dirpath = Path(dirpath).expanduser()
+        self.manifest_path = self.dirpath / self.manifest_name
+        self.manifest = self.load_manifest()
+
+    @classmethod
+    def from_config(cls, cfg) -> "TransactionStore":
+        dirpath = cfg.get("store_dir", "")
+        if not dirpath:
+            dirpath = Path(cfg["output_dir"]).expanduser() / "store"
+        return cls(Path(dirpath))
+
+    def load_manifest(self) -> dict:
+        if not self.manifest_path.is_file():
+            return {"sources": {}}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def save_manifest(self) -> None:
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def has_source(self, source_hash: str) -> bool:
+        return source_hash in self.manifest["sources"]
+
+    def get_partition_path(self, month: str) -> Path:
+        return self.dirpath / f"{PARTITION_COLUMN}={month}"
+
+    def get_months(self) -> list[str]:
+        if not self.dirpath.is_dir():
+            return []
+        prefix = f"{PARTITION_COLUMN}="
+        months = []
+        with os.scandir(self.dirpath) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name.startswith(prefix):
+                    months.append(entry.name.removeprefix(prefix))
+        return sorted(months)
+
+    def read_partition(
+        self,
+        month: str,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[tuple]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Rows of one month, or None when nothing matched
+
+        Part files are read one by one and concatenated, so parts written
+        before the schema was pinned, with a null column, still combine with
+        the others.
+        """
+        dirpath = self.get_partition_path(month)
+        if not dirpath.is_dir():
+            return None
+        frames = []
+        for fpath in sorted(dirpath.glob("*.parquet")):
+            df = pd.read_parquet(fpath, columns=columns, filters=filters)
+            if not df.empty:
+                frames.append(df)
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+    def read_row_keys(self, month: str) -> pd.Index:
+        df = self.read_partition(month, columns=["row_key"])
+        if df is None:
+            return pd.Index([], dtype="uint64")
+        return pd.Index(df["row_key"])
+
+    def append(
+        self, df: pd.DataFrame, source_hash: str = "", source_name: str = ""
+    ) -> int:
+        """Appends transactions not yet in the store; returns rows written"""
+        if source_hash and self.has_source(source_hash):
+            lg.debug(f"store already holds {source_name or source_hash[:12]}")
+            return 0
+        if df.empty:
+            return 0
+        df = df.reset_index(drop=True)
+        df["row_key"] = make_row_keys(df).to_numpy()
+        months = df["date_transacted"].dt.strftime("%Y-%m")
+        part_name = f"part-{source_hash[:16] or get_time()}.parquet"
+
+        written = 0
+        for month, part in df.groupby(months, sort=True):
+            part = part[~part["row_key"].isin(self.read_row_keys(month))]
+            if part.empty:
+                continue
+            dirpath = self.get_partition_path(month)
+            dirpath.mkdir(parents=True, exist_ok=True)
+            fpath = dirpath / part_name
+            tmp_fpath = fpath.with_suffix(".tmp")
+            write_part(part, tmp_fpath)
+            os.replace(tmp_fpath, fpath)
+            written += len(part)
+
+        if source_hash:
+            self.manifest["sources"][source_hash] = {
+                "name": source_name,
+                "rows": written,
+                "ingested": get_time(),
+            }
+            self.save_manifest()
+        lg.info(f"store appended {written} rows from {source_name or 'frame'}")
+        return written
+
+    def read(
+        self,
+        start=None,
+        end=None,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[tuple]] = None,
+    ) -> pd.DataFrame:
+        """Reads transactions dated within [start, end]
+
+        Only partitions for the months in range are opened; the date bounds
+        and any extra filters are pushed down into the parquet reader.
+        """
+        months = self.get_months()
+        if start is not None:
+            start = pd.Timestamp(start)
+            months = [m for m in months if m >= to_month(start)]
+        if end is not None:
+            end = pd.Timestamp(end)
+            months = [m for m in months if m <= to_month(end)]
+
+        pushdown = list(filters or [])
+        if start is not None:
+            pushdown.append(("date_transacted", ">=", start))
+        if end is not None:
+            pushdown.append(("date_transacted", "<=", end))
+        frames = []
+        for month in months:
+            df = self.read_partition(month, columns=columns, filters=pushdown or None)
+            if df is not None:
+                frames.append(df)
+        if not frames:
+            return empty_frame(columns)
+        df = pd.concat(frames, ignore_index=True)
+        if "date_transacted" in df.columns:
+            df = df.sort_values("date_transacted", kind="stable")
+        return df.reset_index(drop=True)
+
+
+class TransactionStoreReader:
+    """Serves views from the transaction store instead of parsing statements"""
+
+    def __init__(self, store: TransactionStore, start=None, end=None) -> None:
+        self.store = store
+        self.start = start
+        self.end = end
+        # minor units are rederived, since older partitions were written without them
+        df = store.read(start=start, end=end)
+        if df.empty:
+            lg.warning(f"no transactions in the store in range; {start=} {end=}")
+        else:
+            df = add_minor_units(df)
+        self.df = compact_from_config(df, get_config())
+
+
+def test_transaction_store_overlap():
+    """Overlapping statements where only the first has foreign currency rows"""
+    import tempfile
+
+    def make_statement(dates: list[str], currency_foreign) -> pd.DataFrame:
+        dates = pd.to_datetime(dates)
+        return pd.DataFrame(
+            {
+                "date_transacted": dates,
+                "date_posted": dates.strftime("%d %b %Y"),
+                "description": [f"MERCHANT {d:%d}  SINGAPORE" for d in dates],
+                "currency_foreign": currency_foreign,
+                "amount_foreign": 12.5 if currency_foreign else float("nan"),
+                "currency": "SGD",
+                "amount": 10.0,
+            }
+        )
+
+    # the second statement's part file sorts first in the partition
+    with tempfile.TemporaryDirectory() as dirpath:
+        store = TransactionStore(Path(dirpath))
+        first = make_statement(["2024-01-03", "2024-01-10"], "USD")
+        second = make_statement(["2024-01-10", "2024-01-17", "2024-02-01"], None)
+        assert store.append(first, source_hash="b" * 64) == 2
+        assert store.append(second, source_hash="a" * 64) == 2
+        df = store.read(start="2024-01-01")
+        assert len(df) == 4
+        assert df["currency_foreign"].notna().sum() == 2
+        assert store.read(start="2030-01-01").columns.tolist() == list(STORE_TYPES)
+        print(df)
+
+
+if __name__ == "__main__":
+    test_transaction_store_overlap()
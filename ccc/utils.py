@@ -1,6 +1,11 @@
+import atexit
+import functools
 import logging
+import logging.handlers
+import multiprocessing
 import os
 import platform
+import queue
 import re
 import shutil
 import subprocess
@@ -8,11 +13,69 @@ import time
 import unicodedata
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from typing import Callable, Optional
+
+from .instrument import span
 
 APP_NAME = "ccc"
 
 
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a bounded queue drained by a QueueListener thread
+
+    Overflow policy, when the listener falls behind and the queue is full:
+    with overflow="drop", records below WARNING are dropped and counted, and
+    a warning with the count is queued once there is room again; WARNING
+    and above always wait for room. With overflow="block", every record
+    waits, which throttles the producer to the speed of the file and console
+    handlers.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "drop"):
+        super().__init__(log_queue)
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"unknown {overflow=}; expected drop or block")
+        self.overflow = overflow
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == "block" or record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self.make_dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def make_dropped_record(self) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": APP_NAME,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"log queue full; dropped {self.dropped} records",
+            }
+        )
+
+
+def init_worker_logging(log_queue) -> None:
+    """Process pool initializer sending worker records to the parent process"""
+    logger = logging.getLogger(APP_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
 class LoggerManager:
+    # set when the first LoggerManager starts asynchronous logging
+    listener: Optional[logging.handlers.QueueListener] = None
+    # drains the records of process pool workers; see get_worker_logging
+    worker_listener: Optional[logging.handlers.QueueListener] = None
+
     def __init__(
         self,
         app_name: str = "",
@@ -20,6 +83,9 @@ class LoggerManager:
         logfile_maxBytes: int = 2_097_152,
         default_level=logging.INFO,
         debug_mode: bool = False,
+        async_mode: bool = False,
+        queue_size: int = 10_000,
+        overflow: str = "drop",
     ):
         if not app_name:
             app_name = __name__
@@ -28,6 +94,9 @@ class LoggerManager:
             self.default_level = logging.DEBUG
         self.logfile_backupCount = logfile_backupCount
         self.logfile_maxBytes = logfile_maxBytes
+        self.async_mode = async_mode
+        self.queue_size = queue_size
+        self.overflow = overflow
         self.app_name = app_name
         self.logger_name = app_name
         self.logger = logging.getLogger(self.app_name)
@@ -49,11 +118,49 @@ class LoggerManager:
         chandler = logging.StreamHandler()
         chandler.setLevel(self.default_level)
         chandler.setFormatter(formatter)
-        logger.addHandler(fhandler)
-        logger.addHandler(chandler)
+        if self.async_mode:
+            # file writes and rotation happen on the listener thread
+            log_queue = queue.Queue(maxsize=self.queue_size)
+            logger.addHandler(BoundedQueueHandler(log_queue, overflow=self.overflow))
+            listener = logging.handlers.QueueListener(
+                log_queue, fhandler, chandler, respect_handler_level=True
+            )
+            listener.start()
+            atexit.register(listener.stop)
+            LoggerManager.listener = listener
+        else:
+            logger.addHandler(fhandler)
+            logger.addHandler(chandler)
         logger.info(f"logger initialised - {logger_filepath}")
         return logger
 
+    @classmethod
+    def get_worker_logging(cls) -> tuple[Optional[Callable], tuple]:
+        """initializer and initargs for process pools, with async logging
+
+        Forked workers inherit the queue handler, but nothing drains their
+        copy of the queue. Instead they send records over a multiprocessing
+        queue to a listener in this process, which writes them with the same
+        handlers. Synchronous handlers work in workers as inherited.
+        """
+        if cls.listener is None:
+            return None, ()
+        if cls.worker_listener is None:
+            worker_queue = multiprocessing.Queue()
+            cls.worker_listener = logging.handlers.QueueListener(
+                worker_queue, *cls.listener.handlers, respect_handler_level=True
+            )
+            cls.worker_listener.start()
+            atexit.register(cls.worker_listener.stop)
+        return init_worker_logging, (cls.worker_listener.queue,)
+
+    def get_handlers(self) -> list[logging.Handler]:
+        """Handlers doing the output, including those behind the log queue"""
+        handlers = list(self.logger.handlers)
+        if LoggerManager.listener is not None:
+            handlers += LoggerManager.listener.handlers
+        return handlers
+
     def get_logger(self):
         return self.logger
 
@@ -63,16 +170,16 @@ class LoggerManager:
     def setLevel(self, level: str = "info"):
         match level.lower():
             case "info":
-                for h in self.logger.handlers:
+                for h in self.get_handlers():
                     h.setLevel("INFO")
             case "debug":
-                for h in self.logger.handlers:
+                for h in self.get_handlers():
                     h.setLevel("DEBUG")
             case "warning" | "warn":
-                for h in self.logger.handlers:
+                for h in self.get_handlers():
                     h.setLevel("WARNING")
             case "error":
-                for h in self.logger.handlers:
+                for h in self.get_handlers():
                     h.setLevel("ERROR")
             case _:
                 raise RuntimeError(f"unknown log {level=}")
@@ -99,6 +206,14 @@ class ConfigError(Exception):
     """Error due to invalid parameters in user config file"""
 
 
+class StatementNotFoundError(FileNotFoundError):
+    """No statement file found to parse"""
+
+
+class StatementParseError(Exception):
+    """Statement file exists but could not be parsed"""
+
+
 class QueueHandler(logging.Handler):
     """
     Class to send logging records to a queue
@@ -152,27 +267,33 @@ def get_time(datetimestrformat: str = "%Y%m%d_%H%M%S"):
 
 
 def classtimer(func):
+    @functools.wraps(func)
     def wrapper(ref_self, *args, **kwargs):
-        log = LoggerManager(APP_NAME).getLogger()
         t0 = time.perf_counter()
-        a = func(ref_self, *args, **kwargs)
+        with span(func.__qualname__):
+            a = func(ref_self, *args, **kwargs)
         time_taken = time.perf_counter() - t0
         if time_taken < 100:
             time_taken = f"{time_taken:.4f}s"
         else:
             time_taken = f"{(time_taken/60):.2f}mins"
-        log.info(f"[{func.__name__}] elapsed_time = {time_taken}")
+        logging.getLogger(APP_NAME).info(
+            f"[{func.__name__}] elapsed_time = {time_taken}"
+        )
         return a
 
     return wrapper
 
 
 def timer(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        log = LoggerManager(APP_NAME).getLogger()
         t0 = time.perf_counter()
-        a = func(*args, **kwargs)
-        log.info(f"[{func.__name__}] elapsed_time = {(time.perf_counter()-t0):.4f}s")
+        with span(func.__qualname__):
+            a = func(*args, **kwargs)
+        logging.getLogger(APP_NAME).info(
+            f"[{func.__name__}] elapsed_time = {(time.perf_counter()-t0):.4f}s"
+        )
         return a
 
     return wrapper
@@ -359,15 +480,22 @@ def get_file(
     wildcard_str: str,
     default_index: None | int = -1,
     recursive: bool = True,
+    index=None,
 ):
     """Get file(s) from a given folder, using the given wildcard
 
+    Files are listed through a discovery.DirectoryIndex. Without one, an
+    in-memory index of the folder is built which, like rglob, descends into
+    hidden directories. The wildcard is matched against file names only.
+
     :param folderpath_str: folderpath in string format
     :type folderpath_str: str
     :param wildcard_str: wildcard
     :type wildcard_str: str
     :param default_index: {None: returns all files in a list, 0: returns oldest modified file, -1: returns latest modified file}, defaults to -1
     :type default_index: None | int
+    :param index: index of folderpath_str to list the files from, defaults to None
+    :type index: DirectoryIndex | None
     :raises NotADirectoryError: if folderpath_str is nto a valid directory
     :raises FileNotFoundError: no files found
     :return: list of Path objects or Path, depending on default_index
@@ -378,14 +506,14 @@ def get_file(
     folderpath = Path(folderpath_str)
     if not folderpath.is_dir():
         raise NotADirectoryError(f"{folderpath}=")
-    if recursive:
-        files = [f for f in folderpath.rglob(wildcard_str)]
-    else:
-        files = [f for f in folderpath.glob(wildcard_str)]
+    if index is None:
+        from .discovery import DirectoryIndex
+
+        index = DirectoryIndex(folderpath, recursive=recursive, include_hidden=True)
+    # the index lists files oldest first, with mtimes from a single scandir
+    files = [e.path for e in index.refresh().find(wildcard_str)]
     if not files:
         raise FileNotFoundError(f"{wildcard_str=}; {folderpath=}")
-    # files = sorted(files)
-    files = sorted(files, key=lambda fp: os.stat(fp).st_mtime)
     if default_index is None:
         return files
     elif len(files) > 1:
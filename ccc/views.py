@@ -1,15 +1,20 @@
 import logging
+from typing import Optional
 
-import numpy as np
 import pandas as pd
 
-from .config import ConfigManager
+from .app import create_app
+from .config import get_config
+from .instrument import span, traced
+from .money import format_minor
 from .models import FileManager, UobExcelReader
-from .utils import LoggerManager
+from .query import TransactionIndex
+from .render import ReportRenderer, Sink, resolve_columns
+from .reports import ReportEngine, ReportResult
+from .utils import StatementNotFoundError
 
 APP_NAME = "ccc"
-lg = LoggerManager(APP_NAME).getLogger()
-cfg = ConfigManager().config
+lg = logging.getLogger(APP_NAME)
 
 
 class UobExcelViewer:
@@ -20,6 +25,30 @@ class UobExcelViewer:
 
     def __init__(self, model):
         self.model = model
+        self._report: Optional[ReportResult] = None
+        self._index: Optional[TransactionIndex] = None
+
+    @property
+    def report(self) -> ReportResult:
+        """Report sections of the model frame, recomputed when the frame changes"""
+        df = self.model.df
+        if self._report is None or self._report.df is not df:
+            cfg = get_config()
+            engine = ReportEngine(
+                exclusions=cfg.exclusions,
+                top_n=cfg["number_of_top_big_purchases"],
+            )
+            with span("ReportEngine.compute", rows=len(df)):
+                self._report = engine.compute(df)
+        return self._report
+
+    @property
+    def index(self) -> TransactionIndex:
+        """Query index over the model frame, rebuilt when the frame changes"""
+        df = self.model.df
+        if self._index is None or self._index.df is not df:
+            self._index = TransactionIndex(df)
+        return self._index
 
     def make_text_centered(self, str_value) -> str:
         spaces1 = (self.str_length - (len(str_value) + 4)) // 2
@@ -27,6 +56,36 @@ class UobExcelViewer:
         results = f"\n{'*'*spaces1}  {str_value}  {'*'*spaces2}\n"
         return results
 
+    def make_section(self, title: str, df: pd.DataFrame, total_amount: int) -> str:
+        display_str = ""
+        display_str += self.make_text_centered(title)
+        display_str += f"{df}\n"
+        display_str += f"{'-'*self.str_length}\n"
+        display_str += f"Subtotal = ${format_minor(total_amount)}\n"
+        display_str += f"{'*'*self.str_length}\n"
+        return display_str
+
+    def iter_sections(self):
+        """(title, row positions, total) of each section, in display order"""
+        report = self.report
+        yield "QUALIFIED", report.qualified_rows, report.qualified_total
+        yield "category=3", *report.get_category_rows(3)
+        yield "BIG PURCHASES", report.top_rows, report.top_total
+        yield "category=2", *report.get_category_rows(2)
+        yield "category=5", *report.get_category_rows(5)
+
+    @traced("UobExcelViewer.render")
+    def render(self, sink: Sink, page_size: int = 50):
+        """Streams every section into sink, page_size rows at a time"""
+        df = self.report.df
+        columns = resolve_columns(
+            get_config().get("display_columns", []), df.columns, fallback=self.columns
+        )
+        ReportRenderer(sink, columns, page_size=page_size).render(
+            df, self.iter_sections()
+        )
+
+    @traced("UobExcelViewer.display_data")
     def display_data(self):
         lg.info(self.display_data_qualified())
         lg.info(self.display_data_from_category(3))
@@ -34,60 +93,42 @@ class UobExcelViewer:
         lg.info(self.display_data_from_category(2))
         lg.info(self.display_data_from_category(5))
 
+    @traced("UobExcelViewer.display_data_from_category")
     def display_data_from_category(self, category: int = 1):
-        df = self.model.df.copy()
-        df = df[df["key_code"] == category]
-        total_amount = df["amount"].sum()
-        df = df[self.columns]
-        display_str = ""
-        display_str += self.make_text_centered(f"{category=}")
-        display_str += f"{df}\n"
-        display_str += f"{'-'*self.str_length}\n"
-        display_str += f"Subtotal = ${total_amount:.2f}\n"
-        display_str += f"{'*'*self.str_length}\n"
-        return display_str
+        df, total_amount = self.report.get_category(category, self.columns)
+        return self.make_section(f"{category=}", df, total_amount)
 
+    @traced("UobExcelViewer.display_data_qualified")
     def display_data_qualified(self):
-        df = self.model.df
-        df = df[~df["item"].isin(cfg["exclusions"])]
-        df = df[df["qualified"]]
-        total_amount = df["amount"].sum()
-        df = df[self.columns]
-        display_str = ""
-        display_str += self.make_text_centered("QUALIFIED")
-        display_str += f"{df}\n"
-        display_str += f"{'-'*self.str_length}\n"
-        display_str += f"Subtotal = ${total_amount:.2f}\n"
-        display_str += f"{'*'*self.str_length}\n"
-        return display_str
+        df, total_amount = self.report.get_qualified(self.columns)
+        return self.make_section("QUALIFIED", df, total_amount)
 
+    @traced("UobExcelViewer.display_data_biggest")
     def display_data_biggest(self, title: str = "BIG PURCHASES"):
-        df = self.model.df.copy()
-        df = (
-            df[df["amount"] > 0]
-            .sort_values("amount", ascending=False)
-            .head(cfg["number_of_top_big_purchases"])
-        )
-        total_amount = df["amount"].sum()
-        df = df[self.columns]
-        display_str = ""
-        display_str += self.make_text_centered(title)
-        display_str += f"{df}\n"
-        display_str += f"{'-'*self.str_length}\n"
-        display_str += f"Subtotal = ${total_amount:.2f}\n"
-        display_str += f"{'*'*self.str_length}\n"
-        return display_str
+        df, total_amount = self.report.get_top(self.columns)
+        return self.make_section(title, df, total_amount)
+
+    @traced("UobExcelViewer.display_rebate")
+    def display_rebate(self, ledger, title: str = "UOB ONE REBATE"):
+        df = ledger.report()
+        total_earned = int(df["earned"].sum())
+        for col in ["spend", "projected", "earned"]:
+            df[col] = df[col].map(format_minor)
+        return self.make_section(title, df, total_earned)
 
 
 def test_uob_excel_viewer():
+    create_app()
     pd.set_option("display.max_rows", 50)
     pd.set_option("display.max_columns", 15)
     pd.set_option("display.width", 1000)
 
     model = UobExcelReader()
-    if model.df.empty:
+    try:
+        model.df
+    except StatementNotFoundError:
         fpath = FileManager().get_file_from_output()
-        model.parse(fpath=fpath, cleanup=False)
+        model = UobExcelReader(fpath=fpath, cleanup=False)
     uob = UobExcelViewer(model)
     uob.display_data()
 
@@ -0,0 +1,223 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+APP_NAME = "ccc"
+lg = logging.getLogger(APP_NAME)
+
+# browsers download into a temporary name and rename it when done
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".partial", ".download", ".tmp")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Blocks on inotify events of one directory; Linux only
+
+    Waiting costs no CPU, and a finished download is reported as soon as it
+    is closed or renamed into place.
+    """
+
+    mask: int = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+    def __init__(self, dirpath: Path) -> None:
+        self.dirpath = dirpath
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.mask)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed; {dirpath=}")
+
+    def wait(self, timeout: Optional[float]) -> set[str]:
+        """Names changed in the directory; empty when timeout expires first"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Polls the directory mtime and rescans only when it changed
+
+    The mtime of a directory changes when entries are created, renamed or
+    removed, so an idle directory costs one stat per interval.
+    """
+
+    def __init__(self, dirpath: Path, interval: float = 1.0) -> None:
+        self.dirpath = dirpath
+        self.interval = interval
+        self.dir_mtime_ns = 0
+        self.entries: dict[str, tuple[int, int]] = {}
+
+    def scan(self) -> dict[str, tuple[int, int]]:
+        entries = {}
+        with os.scandir(self.dirpath) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return entries
+
+    def wait(self, timeout: Optional[float]) -> set[str]:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        mtime_ns = os.stat(self.dirpath).st_mtime_ns
+        if mtime_ns == self.dir_mtime_ns:
+            return set()
+        self.dir_mtime_ns = mtime_ns
+        entries = self.scan()
+        changed = {k for k, v in entries.items() if self.entries.get(k) != v}
+        self.entries = entries
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(dirpath: Path, interval: float = 1.0):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(dirpath)
+        except (OSError, AttributeError) as e:
+            lg.warning(f"inotify unavailable, polling instead; {e}")
+    return PollingWatcher(dirpath, interval=interval)
+
+
+@dataclass
+class PendingFile:
+    fpath: Path
+    signature: tuple[int, int]
+    stable_since: float
+
+
+def get_signature(fpath: Path) -> Optional[tuple[int, int]]:
+    try:
+        stat = fpath.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class StatementWatcher:
+    """Calls `on_statement` for each statement that lands in a directory
+
+    A matching file is handed over once its size and mtime have not changed
+    for `settle` seconds, which skips downloads still being written.
+    Temporary download names are ignored outright.
+    """
+
+    def __init__(
+        self,
+        on_statement: Callable[[Path], None],
+        dir_str: str = "~/Downloads",
+        filepattern: str = "CC_TXN_History_*.xls",
+        settle: float = 1.0,
+        interval: float = 1.0,
+    ) -> None:
+        self.on_statement = on_statement
+        self.dirpath = Path(dir_str).expanduser()
+        if not self.dirpath.is_dir():
+            raise NotADirectoryError(f"invalid {self.dirpath=}")
+        self.filepattern = filepattern
+        self.settle = settle
+        self.interval = interval
+        self.pending: dict[str, PendingFile] = {}
+        self.handled: dict[str, tuple[int, int]] = {}
+
+    def is_candidate(self, name: str) -> bool:
+        if name.endswith(PARTIAL_SUFFIXES):
+            return False
+        return fnmatch.fnmatch(name, self.filepattern)
+
+    def track(self, names, now: float) -> None:
+        for name in names:
+            if not self.is_candidate(name):
+                continue
+            fpath = self.dirpath / name
+            signature = get_signature(fpath)
+            if signature is None or signature == self.handled.get(name):
+                self.pending.pop(name, None)
+                continue
+            pending = self.pending.get(name)
+            if pending is None or pending.signature != signature:
+                self.pending[name] = PendingFile(fpath, signature, now)
+
+    def get_settled(self, now: float) -> list[Path]:
+        """Pending files unchanged for `settle` seconds, re-checked on disk"""
+        settled = []
+        for name, pending in list(self.pending.items()):
+            if now - pending.stable_since < self.settle:
+                continue
+            signature = get_signature(pending.fpath)
+            if signature is None:
+                del self.pending[name]
+            elif signature != pending.signature or signature[0] == 0:
+                pending.signature, pending.stable_since = signature, now
+            else:
+                del self.pending[name]
+                self.handled[name] = signature
+                settled.append(pending.fpath)
+        return settled
+
+    def get_timeout(self, now: float) -> Optional[float]:
+        if not self.pending:
+            return None
+        due = min(p.stable_since for p in self.pending.values()) + self.settle
+        return max(0.0, due - now)
+
+    def run(self, max_events: Optional[int] = None) -> None:
+        """Watches until interrupted, or until max_events statements were handled"""
+        watcher = make_watcher(self.dirpath, interval=self.interval)
+        lg.info(
+            f"watching {self.dirpath} for {self.filepattern}; "
+            f"using {type(watcher).__name__}"
+        )
+        handled = 0
+        # statements downloaded while nobody was watching
+        self.track(os.listdir(self.dirpath), time.monotonic())
+        try:
+            while max_events is None or handled < max_events:
+                names = watcher.wait(self.get_timeout(time.monotonic()))
+                now = time.monotonic()
+                self.track(names, now)
+                for fpath in self.get_settled(now):
+                    try:
+                        self.on_statement(fpath)
+                    except Exception:
+                        lg.exception(f"failed to ingest {fpath.name}")
+                    handled += 1
+        finally:
+            watcher.close()
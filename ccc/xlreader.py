@@ -0,0 +1,151 @@
+import io
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Union
+
+import pandas as pd
+
+from .utils import StatementParseError
+
+Source = Union[str, Path, IO[bytes]]
+
+XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+XLSX_MAGIC = b"PK\x03\x04"
+# how far down the sheet to look for the header row
+HEADER_PROBE_ROWS = 50
+
+
+def read_head(source: Source, size: int = 8) -> bytes:
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return f.read(size)
+    pos = source.tell()
+    head = source.read(size)
+    source.seek(pos)
+    return head
+
+
+def sniff_format(source: Source) -> str:
+    head = read_head(source)
+    if head.startswith(XLS_MAGIC):
+        return "xls"
+    if head.startswith(XLSX_MAGIC):
+        return "xlsx"
+    raise StatementParseError(f"not an excel workbook; {head=}")
+
+
+def iter_xls_rows(source: Source) -> Iterator[tuple]:
+    import xlrd
+
+    if isinstance(source, (str, Path)):
+        book = xlrd.open_workbook(filename=str(source), on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for r in range(sheet.nrows):
+            row = []
+            for cell in sheet.row(r):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    row.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(
+                        xlrd.xldate.xldate_as_datetime(cell.value, book.datemode)
+                    )
+                elif cell.ctype == xlrd.XL_CELL_TEXT and not cell.value.strip():
+                    row.append(None)
+                else:
+                    row.append(cell.value)
+            yield tuple(row)
+    finally:
+        book.release_resources()
+
+
+def iter_xlsx_rows(source: Source) -> Iterator[tuple]:
+    import openpyxl
+
+    # openpyxl rejects paths by extension, and UOB names xlsx exports .xls
+    f = open(source, "rb") if isinstance(source, (str, Path)) else source
+    book = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        for row in book.worksheets[0].iter_rows(values_only=True):
+            yield tuple(
+                None if isinstance(v, str) and not v.strip() else v for v in row
+            )
+    finally:
+        book.close()
+        if f is not source:
+            f.close()
+
+
+def iter_rows(source: Source) -> Iterator[tuple]:
+    """Yields every sheet row as a tuple of typed cell values, blanks as None"""
+    if sniff_format(source) == "xls":
+        return iter_xls_rows(source)
+    return iter_xlsx_rows(source)
+
+
+@dataclass
+class StatementRows:
+    """Header and row stream of a statement sheet"""
+
+    header: list[str]
+    header_row: int
+    rows: Iterator[tuple] = field(repr=False)
+
+
+def find_header(
+    rows: Iterator[tuple], header_names: Iterable[str], min_matches: int = 3
+) -> tuple[int, tuple]:
+    expected = set(header_names)
+    min_matches = min(min_matches, len(expected))
+    for i, row in enumerate(rows):
+        if i >= HEADER_PROBE_ROWS:
+            break
+        found = {v.strip() for v in row if isinstance(v, str)}
+        if min_matches and len(found & expected) >= min_matches:
+            return i, row
+    raise StatementParseError(f"header row not found; {sorted(expected)=}")
+
+
+def read_statement_rows(
+    source: Source,
+    header_names: Iterable[str],
+    drop_na_threshold: Optional[int] = None,
+) -> StatementRows:
+    """Locates the header row and streams the transaction rows below it
+
+    Rows with at least drop_na_threshold empty cells, such as blank lines and
+    the summary footer, are skipped as they stream past.
+    """
+    rows = iter_rows(source)
+    header_row, header = find_header(rows, header_names)
+    header = [
+        v.strip() if isinstance(v, str) else f"Unnamed: {i}"
+        for i, v in enumerate(header)
+    ]
+    width = len(header)
+
+    def stream():
+        for row in rows:
+            row = (row + (None,) * width)[:width]
+            nulls = sum(v is None for v in row)
+            if nulls == width:
+                continue
+            if drop_na_threshold is not None and nulls >= drop_na_threshold:
+                continue
+            yield row
+
+    return StatementRows(header=header, header_row=header_row, rows=stream())
+
+
+def read_statement(
+    source: Source,
+    header_names: Iterable[str],
+    drop_na_threshold: Optional[int] = None,
+) -> pd.DataFrame:
+    """Builds the statement frame from the row stream in a single allocation"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    sr = read_statement_rows(source, header_names, drop_na_threshold)
+    return pd.DataFrame.from_records(list(sr.rows), columns=sr.header)